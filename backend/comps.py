@@ -0,0 +1,112 @@
+import asyncio
+import math
+import threading
+import numpy as np
+from typing import Optional
+from scipy.spatial import cKDTree
+from backend.database import get_db
+
+OPERATIONS = ["Arriendo", "Venta"]
+COMPS_FIELDS = ["WEB_PROPERTY_CODE", "PRICE", "AREA", "STRATUM", "ROOMS", "BATHROOMS", "LATITUDE", "LONGITUDE", "LINK"]
+
+# Feature scaling: one unit of distance is roughly 1 km, a ~65% area difference or one stratum step
+KM_PER_DEGREE = 111.32
+REFERENCE_LATITUDE = 4.65  # Bogotá
+AREA_WEIGHT = 2.0
+STRATUM_WEIGHT = 1.0
+
+# How often the background task checks for a new ingestion batch
+REFRESH_CHECK_SECONDS = 300
+
+
+def scale_features(lat, lon, area, stratum) -> np.ndarray:
+    lat = np.asarray(lat, dtype=np.float64)
+    return np.column_stack([
+        lat * KM_PER_DEGREE,
+        np.asarray(lon, dtype=np.float64) * KM_PER_DEGREE * math.cos(math.radians(REFERENCE_LATITUDE)),
+        np.log1p(np.asarray(area, dtype=np.float64)) * AREA_WEIGHT,
+        np.asarray(stratum, dtype=np.float64) * STRATUM_WEIGHT,
+    ])
+
+
+def latest_batch_id(db) -> Optional[str]:
+    batches = [
+        doc.get("batch_id")
+        for op in OPERATIONS
+        for doc in db[op].find({}, {"batch_id": 1}).sort("batch_id", -1).limit(1)
+    ]
+    return max((b for b in batches if b), default=None)
+
+
+class ComparablesIndex:
+    """KD-trees over cleaned listings, one per (operation, PROPERTY_TYPE) partition."""
+
+    def __init__(self, db):
+        self.batch_id = latest_batch_id(db)
+        self.partitions: dict[tuple[str, str], tuple[cKDTree, list[dict]]] = {}
+
+        for op in OPERATIONS:
+            cursor = db[op].find(
+                {
+                    "LATITUDE": {"$type": "number"}, "LONGITUDE": {"$type": "number"},
+                    "AREA": {"$gt": 0}, "PRICE": {"$gt": 0}, "STRATUM": {"$type": "number"},
+                },
+                {"_id": 0, "PROPERTY_TYPE": 1, **{f: 1 for f in COMPS_FIELDS}}
+            )
+            grouped: dict[str, list[dict]] = {}
+            for doc in cursor:
+                grouped.setdefault(doc.pop("PROPERTY_TYPE", None), []).append(doc)
+
+            for ptype, listings in grouped.items():
+                points = scale_features(
+                    [d["LATITUDE"] for d in listings], [d["LONGITUDE"] for d in listings],
+                    [d["AREA"] for d in listings], [d["STRATUM"] for d in listings]
+                )
+                self.partitions[(op, ptype)] = (cKDTree(points), listings)
+
+    def query(self, operation: str, property_type: str, lat: float, lon: float, area: float, stratum: float, k: int) -> list[dict]:
+        partition = self.partitions.get((operation, property_type))
+        if partition is None or k <= 0:
+            return []
+
+        tree, listings = partition
+        k = min(k, tree.n)
+        distances, indices = tree.query(scale_features([lat], [lon], [area], [stratum])[0], k=k)
+        distances, indices = np.atleast_1d(distances), np.atleast_1d(indices)
+        return [{**listings[i], "distance": float(d)} for d, i in zip(distances, indices)]
+
+
+_INDEX: Optional[ComparablesIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+def refresh_comps_index() -> ComparablesIndex:
+    """Build a new index if none is loaded or a new ingestion batch showed up, then swap it in."""
+    global _INDEX
+    db = get_db()
+    with _INDEX_LOCK:
+        current = _INDEX
+    if current is not None and latest_batch_id(db) == current.batch_id:
+        return current
+
+    # Built outside the lock, requests keep querying the previous index meanwhile
+    index = ComparablesIndex(db)
+    with _INDEX_LOCK:
+        _INDEX = index
+    return index
+
+async def refresh_comps_periodically(interval: float = REFRESH_CHECK_SECONDS):
+    """Background task started by the app's lifespan, the only place the index is rebuilt after startup."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(refresh_comps_index)
+        except Exception as e:
+            print(f"⚠️ Comparables index refresh failed: {e}")
+
+def get_comps_index() -> ComparablesIndex:
+    """The current index, never built in the request thread."""
+    with _INDEX_LOCK:
+        index = _INDEX
+    if index is None:
+        raise RuntimeError("Comparables index is not built yet")
+    return index
@@ -0,0 +1,57 @@
+import math
+from functools import reduce
+import numpy as np
+
+GEOHASH_ALPHABET = np.array(list("0123456789bcdefghjkmnpqrstuvwxyz"))
+
+# Map zoom levels (slippy-map tiles) to the geohash precision drawn at that zoom
+ZOOM_PRECISION = [(9, 4), (12, 5), (14, 6), (99, 7)]
+HEATMAP_PRECISIONS = sorted({precision for _, precision in ZOOM_PRECISION})
+
+
+def zoom_to_precision(z: int) -> int:
+    for max_zoom, precision in ZOOM_PRECISION:
+        if z <= max_zoom:
+            return precision
+    return ZOOM_PRECISION[-1][1]
+
+
+def tile_bbox(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) of a web-mercator tile."""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return lat(y + 1), x / n * 360 - 180, lat(y), (x + 1) / n * 360 - 180
+
+
+def _bits(precision: int) -> tuple[int, int]:
+    total = 5 * precision
+    return total // 2, total - total // 2  # lat bits, lon bits
+
+
+def geohash_encode(lat, lon, precision: int):
+    """Vectorized geohash of coordinate arrays. Returns (hashes, cell_center_lat, cell_center_lon)."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    lat_bits, lon_bits = _bits(precision)
+
+    lat_idx = np.clip(((lat + 90) / 180 * (1 << lat_bits)).astype(np.int64), 0, (1 << lat_bits) - 1)
+    lon_idx = np.clip(((lon + 180) / 360 * (1 << lon_bits)).astype(np.int64), 0, (1 << lon_bits) - 1)
+
+    # Interleave bits starting with longitude, most significant first
+    code = np.zeros(lat.shape, dtype=np.int64)
+    for i in range(5 * precision):
+        if i % 2 == 0:
+            bit = (lon_idx >> (lon_bits - 1 - i // 2)) & 1
+        else:
+            bit = (lat_idx >> (lat_bits - 1 - i // 2)) & 1
+        code = (code << 1) | bit
+
+    chars = [GEOHASH_ALPHABET[(code >> (5 * (precision - 1 - c))) & 31] for c in range(precision)]
+    hashes = reduce(np.char.add, chars)
+
+    center_lat = (lat_idx + 0.5) / (1 << lat_bits) * 180 - 90
+    center_lon = (lon_idx + 0.5) / (1 << lon_bits) * 360 - 180
+    return hashes, center_lat, center_lon
@@ -1,11 +1,26 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from backend import comps
 from backend.routers import predict, recommend, stats
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The comparables index is built before serving and refreshed in the background, never per request
+    try:
+        await asyncio.to_thread(comps.refresh_comps_index)
+    except Exception as e:
+        print(f"⚠️ Comparables index not built at startup: {e}")
+    refresh_task = asyncio.create_task(comps.refresh_comps_periodically())
+    yield
+    refresh_task.cancel()
+
 app = FastAPI(
     title="InmueblesApp Backend API",
     description="API for property price prediction and recommendations",
     version="2.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS for React frontend
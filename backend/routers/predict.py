@@ -1,9 +1,13 @@
 import os
+from threading import Lock
+import numpy as np
 import pandas as pd
 import mlflow
-from fastapi import APIRouter, HTTPException, Request
-from pydantic import BaseModel
+from cachetools import LRUCache
+from fastapi import APIRouter, HTTPException, Query, Request
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional
+from backend.comps import get_comps_index
 
 router = APIRouter()
 
@@ -26,13 +30,33 @@ class PropertyInput(BaseModel):
     ANTIQUITY: str
     PROPERTY_TYPE: str
 
+class GridRequest(BaseModel):
+    template: PropertyInput
+    min_lat: float
+    min_lon: float
+    max_lat: float
+    max_lon: float
+    resolution: int = Field(50, ge=2, le=250)
+
+    @model_validator(mode="after")
+    def check_bbox(self):
+        if self.min_lat >= self.max_lat or self.min_lon >= self.max_lon:
+            raise ValueError("bbox must satisfy min_lat < max_lat and min_lon < max_lon")
+        return self
+
 # In a real app with lifespan events, the model is attached to the app state
 # For modularity, we'll expose a function or assume it's attached to request.app.state.model
 # Or load it dynamically if None
 _MODEL = None
+_MODEL_VERSION = None
+
+GRID_CHUNK_ROWS = 10_000
+_GRID_CACHE = LRUCache(maxsize=64)
+# Held around every cache access only, not the prediction (LRU bookkeeping isn't thread-safe)
+_GRID_CACHE_LOCK = Lock()
 
 def get_model():
-    global _MODEL
+    global _MODEL, _MODEL_VERSION
     if _MODEL is not None:
         return _MODEL
 
@@ -41,6 +65,8 @@ def get_model():
     
     try:
         _MODEL = mlflow.sklearn.load_model("models:/price_prediction_model/latest")
+        versions = mlflow.MlflowClient().search_model_versions("name='price_prediction_model'")
+        _MODEL_VERSION = max((int(v.version) for v in versions), default=None)
     except Exception as e:
         print(f"Failed to load from registry: {e}. Scanning filesystem fallback...")
         base_path = "/app/mlruns"
@@ -55,11 +81,16 @@ def get_model():
                         latest_model_path = root
             if latest_model_path:
                 _MODEL = mlflow.sklearn.load_model(latest_model_path)
+                _MODEL_VERSION = latest_model_path
     
     return _MODEL
 
 @router.post("/predict")
-def predict_price(property: PropertyInput):
+def predict_price(
+    property: PropertyInput,
+    with_comps: int = Query(0, ge=0, le=50, description="Number of comparable listings to return"),
+    operation: str = Query("Venta", description="Collection the comparables come from (Arriendo or Venta)"),
+):
     model = get_model()
     if not model:
         raise HTTPException(status_code=503, detail="Model not loaded or found in mlruns")
@@ -70,6 +101,64 @@ def predict_price(property: PropertyInput):
     try:
         prediction = model.predict(data)
         price = prediction[0] if hasattr(prediction, '__iter__') else prediction
-        return {"predicted_price": float(price)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+    response = {"predicted_price": float(price)}
+    if with_comps:
+        try:
+            response["comps"] = get_comps_index().query(
+                operation, property.PROPERTY_TYPE,
+                property.LATITUDE, property.LONGITUDE, property.AREA, property.STRATUM,
+                k=with_comps
+            )
+        except Exception as e:
+            print(f"Comparables lookup failed: {e}")
+            response["comps"] = []
+            response["warning"] = "Comparables lookup failed."
+    return response
+
+
+@router.post("/predict/grid")
+def predict_price_grid(req: GridRequest):
+    model = get_model()
+    if not model:
+        raise HTTPException(status_code=503, detail="Model not loaded or found in mlruns")
+
+    cache_key = (_MODEL_VERSION, req.model_dump_json())
+    with _GRID_CACHE_LOCK:
+        cached = _GRID_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Rows run north to south and columns west to east, so the grid maps directly onto image pixels
+    lats = np.linspace(req.max_lat, req.min_lat, req.resolution)
+    lons = np.linspace(req.min_lon, req.max_lon, req.resolution)
+    grid_lat, grid_lon = np.meshgrid(lats, lons, indexing="ij")
+
+    template = req.template.model_dump()
+    data = pd.DataFrame(
+        {**template, "LATITUDE": grid_lat.ravel(), "LONGITUDE": grid_lon.ravel()},
+        columns=list(template)
+    )
+
+    try:
+        prices = np.empty(len(data), dtype=np.float64)
+        for start in range(0, len(data), GRID_CHUNK_ROWS):
+            chunk = data.iloc[start:start + GRID_CHUNK_ROWS]
+            prices[start:start + len(chunk)] = np.asarray(model.predict(chunk)).ravel()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    result = {
+        "model_version": _MODEL_VERSION,
+        "shape": [req.resolution, req.resolution],
+        "lats": lats.round(6).tolist(),
+        "lons": lons.round(6).tolist(),
+        "min_price": float(prices.min()),
+        "max_price": float(prices.max()),
+        "prices": prices.round().reshape(req.resolution, req.resolution).tolist(),
+    }
+    with _GRID_CACHE_LOCK:
+        _GRID_CACHE[cache_key] = result
+    return result
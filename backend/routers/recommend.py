@@ -1,11 +1,18 @@
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List, Dict, Any
 from backend.utils import embed
 from backend.database import get_db
 
 router = APIRouter()
 
+DEFAULT_FIELDS = ["PRICE", "AREA", "ROOMS", "BATHROOMS", "LATITUDE", "LONGITUDE", "LINK", "PROPERTY_TYPE", "DESCRIPTION"]
+SELECTABLE_FIELDS = DEFAULT_FIELDS + [
+    "WEB_PROPERTY_CODE", "SOURCE", "OPERATION_TYPE", "STRATUM", "BEDROOMS", "GARAGE", "FLOOR",
+    "ANTIQUITY", "BUILT_AREA", "PRIVATE_AREA", "CONSTRUCTION_YEAR", "PRICE_ADMIN_INCLUDED",
+]
+
 class RecommendRequest(BaseModel):
     query: str
     operation_type: str = "Arriendo" # e.g. "Arriendo" or "Venta"
@@ -14,18 +21,37 @@ class RecommendRequest(BaseModel):
     max_price: Optional[float] = None
     min_area: Optional[float] = None
     limit: int = 10
+    # At least one field, an empty inclusion projection would turn into {"_id": 0} and return whole documents
+    fields: List[str] = Field(default_factory=lambda: list(DEFAULT_FIELDS), min_length=1)
+    description_chars: Optional[int] = Field(280, ge=1, description="Truncate DESCRIPTION server-side, None returns it whole")
+
+    @field_validator("fields")
+    @classmethod
+    def check_fields(cls, fields: List[str]) -> List[str]:
+        unknown = set(fields) - set(SELECTABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields {sorted(unknown)}, choose from {SELECTABLE_FIELDS}")
+        return fields
+
+def build_projection(fields: List[str], description_chars: Optional[int]) -> Dict[str, Any]:
+    # Inclusion-only projection, so the embedding (and anything else) never leaves the database
+    projection: Dict[str, Any] = {"_id": 0, **{field: 1 for field in fields}}
+    if "DESCRIPTION" in fields and description_chars:
+        projection["DESCRIPTION"] = {"$substrCP": [{"$ifNull": ["$DESCRIPTION", ""]}, 0, description_chars]}
+    return projection
 
-@router.post("/recommend")
+@router.post("/recommend", response_class=ORJSONResponse)
 def recommend_properties(req: RecommendRequest):
     db = get_db()
     collection = db[req.operation_type]
+    projection = build_projection(req.fields, req.description_chars)
+    filter_conditions = {}
     
     try:
         # Generate vector for text query
         vector = embed(req.query)[0]
         
         # Build filter conditions
-        filter_conditions = {}
         if req.property_type:
             filter_conditions["PROPERTY_TYPE"] = req.property_type
         
@@ -54,17 +80,8 @@ def recommend_properties(req: RecommendRequest):
             },
             {
                 "$project": {
-                    "_id": 0,
                     "score": {"$meta": "vectorSearchScore"},
-                    "PRICE": 1,
-                    "AREA": 1,
-                    "ROOMS": 1,
-                    "BATHROOMS": 1,
-                    "LATITUDE": 1,
-                    "LONGITUDE": 1,
-                    "LINK": 1,
-                    "PROPERTY_TYPE": 1,
-                    "DESCRIPTION": 1
+                    **projection
                 }
             }
         ]
@@ -76,5 +93,5 @@ def recommend_properties(req: RecommendRequest):
         # Fallback if vector index is not ready or failed (local dev without Atlas)
         print(f"Vector search failed: {e}. Falling back to standard search.")
         fallback_query = filter_conditions
-        results = list(collection.find(fallback_query, {"_id": 0}).limit(req.limit))
+        results = list(collection.find(fallback_query, projection).limit(req.limit))
         return {"results": results, "warning": "Vector search failed, using standard search."}
@@ -1,38 +1,141 @@
-from fastapi import APIRouter
+from threading import Lock
+import numpy as np
+from cachetools import TTLCache, cached
+from fastapi import APIRouter, HTTPException, Query
 from backend.database import get_db
+from backend.geo import tile_bbox, zoom_to_precision
 
 router = APIRouter()
 
+OPERATIONS = ["Arriendo", "Venta"]
+QUANTILES = [0.5, 0.9]
+HEATMAP_COLLECTION = "heatmap_cells"  # Written by pipelines.aggregates.build_price_heatmap_op
+HEATMAP_TTL_SECONDS = 600
+
+def _segment_stats(group_key) -> list:
+    # $percentile (approximate) needs MongoDB 7.0+, it ignores missing / non numeric values
+    return [
+        {"$group": {
+            "_id": group_key,
+            "count": {"$sum": 1},
+            "avg_price": {"$avg": "$PRICE"},
+            "avg_area": {"$avg": "$AREA"},
+            "avg_price_m2": {"$avg": "$PRICE_M2"},
+            "price_q": {"$percentile": {"input": "$PRICE", "p": QUANTILES, "method": "approximate"}},
+            "price_m2_q": {"$percentile": {"input": "$PRICE_M2", "p": QUANTILES, "method": "approximate"}},
+        }},
+        {"$sort": {"count": -1}},
+    ]
+
+def build_stats_pipeline() -> list:
+    """Single aggregation over every operation collection, all breakdowns come from one $facet."""
+    first, *others = OPERATIONS
+    return [
+        {"$set": {"OPERATION": first}},
+        *[{"$unionWith": {"coll": op, "pipeline": [{"$set": {"OPERATION": op}}]}} for op in others],
+        {"$project": {
+            "_id": 0,
+            "OPERATION": 1,
+            "PROPERTY_TYPE": 1,
+            "STRATUM": 1,
+            "PRICE": 1,
+            "AREA": 1,
+            "PRICE_M2": {"$cond": [
+                {"$and": [{"$isNumber": "$PRICE"}, {"$isNumber": "$AREA"}, {"$gt": ["$AREA", 0]}]},
+                {"$divide": ["$PRICE", "$AREA"]},
+                None
+            ]},
+        }},
+        {"$facet": {
+            "by_operation": _segment_stats("$OPERATION"),
+            "by_property_type": _segment_stats({"operation": "$OPERATION", "segment": "$PROPERTY_TYPE"}),
+            "by_stratum": _segment_stats({"operation": "$OPERATION", "segment": "$STRATUM"}),
+        }},
+    ]
+
+def _format_segment(doc: dict) -> dict:
+    price_q = doc.get("price_q") or [None] * len(QUANTILES)
+    price_m2_q = doc.get("price_m2_q") or [None] * len(QUANTILES)
+    return {
+        "count": doc["count"],
+        "avg_price": doc.get("avg_price") or 0,
+        "avg_area": doc.get("avg_area") or 0,
+        "avg_price_m2": doc.get("avg_price_m2") or 0,
+        "p50_price": price_q[0],
+        "p90_price": price_q[1],
+        "p50_price_m2": price_m2_q[0],
+        "p90_price_m2": price_m2_q[1],
+    }
+
 @router.get("/stats")
 def get_market_stats():
     db = get_db()
+
+    try:
+        facets = list(db[OPERATIONS[0]].aggregate(build_stats_pipeline()))[0]
+    except Exception as e:
+        return {op: {"error": str(e)} for op in OPERATIONS}
+
     stats = {}
-    
-    for op in ["Arriendo", "Venta"]:
-        collection = db[op]
-        try:
-            total = collection.count_documents({})
-            avg_pipeline = [
-                {"$group": {
-                    "_id": None,
-                    "avg_price": {"$avg": "$PRICE"},
-                    "avg_area": {"$avg": "$AREA"}
-                }}
-            ]
-            agg = list(collection.aggregate(avg_pipeline))
-            if agg:
-                avg_price = agg[0].get("avg_price", 0)
-                avg_area = agg[0].get("avg_area", 0)
-            else:
-                avg_price = 0
-                avg_area = 0
-                
-            stats[op] = {
-                "total_properties": total,
-                "avg_price": avg_price,
-                "avg_area": avg_area
-            }
-        except Exception as e:
-            stats[op] = {"error": str(e)}
-            
+    for op in OPERATIONS:
+        overall = next((doc for doc in facets["by_operation"] if doc["_id"] == op), None)
+        summary = _format_segment(overall) if overall else _format_segment({"count": 0})
+
+        stats[op] = {
+            "total_properties": summary.pop("count"),
+            **summary,
+            "by_property_type": {
+                str(doc["_id"].get("segment")): _format_segment(doc)
+                for doc in facets["by_property_type"] if doc["_id"]["operation"] == op
+            },
+            "by_stratum": {
+                str(doc["_id"].get("segment")): _format_segment(doc)
+                for doc in facets["by_stratum"] if doc["_id"]["operation"] == op
+            },
+        }
+
     return stats
+
+
+# Endpoints run in the threadpool and cachetools caches aren't thread-safe on their own
+@cached(TTLCache(maxsize=32, ttl=HEATMAP_TTL_SECONDS), lock=Lock())
+def load_heatmap_level(operation: str, precision: int) -> dict:
+    """Every pre-aggregated cell of one zoom level as numpy columns, tiles are then served from memory."""
+    db = get_db()
+    docs = list(db[HEATMAP_COLLECTION].find(
+        {"operation": operation, "precision": precision},
+        {"_id": 0, "geohash": 1, "lat": 1, "lon": 1, "count": 1, "median_price_m2": 1}
+    ))
+    return {
+        "geohash": np.array([d["geohash"] for d in docs]),
+        "lat": np.array([d["lat"] for d in docs], dtype=np.float64),
+        "lon": np.array([d["lon"] for d in docs], dtype=np.float64),
+        "count": np.array([d["count"] for d in docs], dtype=np.int64),
+        "median_price_m2": np.array([d["median_price_m2"] for d in docs], dtype=np.float64),
+    }
+
+@router.get("/stats/heatmap")
+def get_price_heatmap(
+    z: int = Query(..., ge=0, le=22),
+    x: int = Query(..., ge=0),
+    y: int = Query(..., ge=0),
+    operation: str = "Venta",
+):
+    if operation not in OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"operation must be one of {OPERATIONS}")
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=400, detail="Tile out of range for zoom level")
+
+    precision = zoom_to_precision(z)
+    level = load_heatmap_level(operation, precision)
+    min_lat, min_lon, max_lat, max_lon = tile_bbox(z, x, y)
+
+    mask = (level["lat"] >= min_lat) & (level["lat"] < max_lat) & (level["lon"] >= min_lon) & (level["lon"] < max_lon)
+    cells = [
+        {"geohash": str(g), "lat": float(la), "lon": float(lo), "count": int(c), "median_price_m2": float(m)}
+        for g, la, lo, c, m in zip(
+            level["geohash"][mask], level["lat"][mask], level["lon"][mask],
+            level["count"][mask], level["median_price_m2"][mask]
+        )
+    ]
+    return {"z": z, "x": x, "y": y, "precision": precision, "cells": cells}
@@ -52,6 +52,112 @@ def trigger_pipeline(
         typer.secho(f"❌ Failed to submit pipeline: {e}", fg=typer.colors.RED)
         raise typer.Exit(1)
 
+@app.command()
+def replay(
+    batch_id: str = typer.Option(None, "--batch", "-b", help="Archived batch to replay (default: latest)"),
+    uri: str = typer.Option(None, "--uri", help="Archive location (default: RAW_ARCHIVE_URI or data/raw_archive)"),
+    workers: int = typer.Option(None, "--workers", "-w", help="Parser processes (default: one per core)"),
+    local: bool = typer.Option(True, "--local/--remote", help="Write to the local or the remote MongoDB")
+):
+    """
+    Re-parse archived raw search responses and ingest them, without touching the network.
+    Only listings whose parsed content changed are re-embedded and rewritten.
+    """
+    import pyarrow as pa
+    from pipelines.utils.archive import ARCHIVE_URI, list_batches, replay_archive
+    from pipelines.utils.writer import ListingWriter
+    from backend.database import MongoSingleton
+    from backend.utils import embed, preprocess_text, create_uuid_from_string
+
+    uri = uri or ARCHIVE_URI
+    batch_id = batch_id or next(reversed(list_batches(uri)), None)
+    if batch_id is None:
+        typer.secho(f"❌ No archived batches under {uri}", fg=typer.colors.RED)
+        raise typer.Exit(1)
+
+    typer.secho(f"♻️ Replaying batch {batch_id} from {uri}...", fg=typer.colors.CYAN)
+    writer = ListingWriter(MongoSingleton(local=local).client["inmuebles_db"])
+    totals = {"parsed": 0, "unchanged": 0, "upserted": 0, "modified": 0, "price_changes": 0}
+
+    for operation, table in replay_archive(batch_id, uri, workers):
+        rows = table.num_rows
+        table = (
+            table.append_column('_id', pa.array([create_uuid_from_string(code) for code in table.column('WEB_PROPERTY_CODE').to_pylist()]))
+                 .append_column('batch_id', pa.repeat(pa.scalar(batch_id), rows))
+        )
+        changed = writer.select_changed(operation, table)
+        totals["parsed"] += rows
+        totals["unchanged"] += rows - changed.num_rows
+        if not changed.num_rows:
+            continue
+
+        vectors = embed([preprocess_text(description or '') for description in changed.column('DESCRIPTION').to_pylist()])
+        changed = changed.drop_columns(['DESCRIPTION']).append_column('embedding', pa.array(vectors, pa.list_(pa.float32())))
+        for key, value in writer.write(operation, changed).items():
+            totals[key] += value
+
+    typer.secho(f"✅ Replayed {totals['parsed']} listings: {totals['upserted']} new, {totals['modified']} updated, "
+                f"{totals['unchanged']} unchanged, {totals['price_changes']} price observations", fg=typer.colors.GREEN)
+
+@app.command()
+def indexes(
+    local: bool = typer.Option(True, "--local/--remote", help="Use the local or the remote MongoDB"),
+    create: bool = typer.Option(True, "--create/--audit-only", help="Create the declared indexes before auditing")
+):
+    """
+    Create the listings indexes (idempotent) and explain every query shape the project runs.
+    Exits with an error when any of them still needs a collection scan.
+    """
+    from backend.database import MongoSingleton
+    from pipelines.utils.indexes import audit_indexes, ensure_indexes
+
+    db = MongoSingleton(local=local).client["inmuebles_db"]
+    if create:
+        for collection, names in ensure_indexes(db).items():
+            typer.secho(f"🗂️ {collection}: {', '.join(names)}", fg=typer.colors.CYAN)
+
+    report = audit_indexes(db)
+    for row in report:
+        color = typer.colors.RED if row["collscan"] else typer.colors.GREEN
+        typer.secho(f"{'❌' if row['collscan'] else '✅'} {row['collection']}.{row['name']}: {' <- '.join(row['stages'])}", fg=color)
+
+    scans = [row for row in report if row["collscan"]]
+    if scans:
+        typer.secho(f"❌ {len(scans)} query shapes run as collection scans", fg=typer.colors.RED)
+        raise typer.Exit(1)
+    typer.secho("✅ Every query shape uses an index", fg=typer.colors.GREEN)
+
+@app.command()
+def clean_snapshot(
+    source: str = typer.Argument(..., help="Parquet snapshot of one listings collection"),
+    destination: str = typer.Argument(..., help="Where to write the cleaned snapshot"),
+    diff_dir: str = typer.Option(None, "--diff", "-d", help="Also write the deletes/updates diff to this directory"),
+    apply_to: str = typer.Option(None, "--apply-to", help="Bulk-apply the diff to this MongoDB collection (needs --diff)"),
+    threads: int = typer.Option(None, "--threads", "-t", help="Threads for the per property type capping (default: one per core)"),
+    local: bool = typer.Option(True, "--local/--remote", help="Apply the diff to the local or the remote MongoDB")
+):
+    """
+    Run the cleaning pipeline (dedup, erroneous values, p99 capping) on a local Parquet snapshot.
+    Same rules as the cleaning ops, but with exact percentiles and without touching MongoDB.
+    """
+    from pipelines.utils.local_cleaning import apply_diff, clean_snapshot as clean
+
+    if apply_to and not diff_dir:
+        typer.secho("❌ --apply-to needs --diff", fg=typer.colors.RED)
+        raise typer.Exit(1)
+
+    typer.secho(f"🧹 Cleaning {source}...", fg=typer.colors.CYAN)
+    stats = clean(source, destination, diff_dir, threads)
+    for ptype, caps in stats["caps"].items():
+        typer.echo(f"  {ptype}: " + " | ".join(f"{field} p99={cap:,.2f}" for field, cap in caps.items()))
+    typer.secho(f"✅ {stats['rows']} rows: {stats['duplicates']} duplicates and {stats['erroneous']} erroneous removed, "
+                f"{stats['capped']} capped -> {destination}", fg=typer.colors.GREEN)
+
+    if apply_to:
+        from backend.database import MongoSingleton
+        result = apply_diff(MongoSingleton(local=local).client["inmuebles_db"][apply_to], diff_dir)
+        typer.secho(f"✅ {apply_to}: {result['deleted']} deleted, {result['modified']} updated", fg=typer.colors.GREEN)
+
 @app.command()
 def info():
     """
@@ -0,0 +1,76 @@
+import os
+from kfp import dsl
+
+# Configuration for Vertex AI
+PROJECT_ID = os.getenv("PROJECT_ID", "inmuebles-app-437-v2")
+LOCATION = os.getenv("LOCATION", "us-central1")
+PIPELINE_ROOT = f"gs://{PROJECT_ID}-pipeline-roots/inmueblesapp"
+
+# We use our custom pipeline image which contains all dependencies and the utils folder
+BASE_IMAGE = f"us-east1-docker.pkg.dev/{PROJECT_ID}/inmuebles-app/pipeline-runner:latest"
+
+@dsl.component(base_image=BASE_IMAGE)
+def build_price_heatmap_op(collections: list, local: bool) -> str:
+    from backend.database import MongoSingleton
+    from backend.geo import HEATMAP_PRECISIONS, geohash_encode
+    from pymongo import ReplaceOne
+    from datetime import datetime
+    import pandas as pd
+    import json
+
+    mongo_client = MongoSingleton(local=local).client
+    db = mongo_client["inmuebles_db"]
+    cells_collection = db["heatmap_cells"]
+    built_at = datetime.now()
+
+    stats = {}
+
+    for col_name in collections:
+        df = pd.DataFrame(list(db[col_name].find(
+            {"LATITUDE": {"$type": "number"}, "LONGITUDE": {"$type": "number"}, "PRICE": {"$gt": 0}, "AREA": {"$gt": 0}},
+            {"_id": 0, "LATITUDE": 1, "LONGITUDE": 1, "PRICE": 1, "AREA": 1}
+        )))
+        if df.empty:
+            continue
+
+        df["PRICE_M2"] = df["PRICE"] / df["AREA"]
+        col_stats = {}
+
+        for precision in HEATMAP_PRECISIONS:
+            hashes, center_lat, center_lon = geohash_encode(df["LATITUDE"].values, df["LONGITUDE"].values, precision)
+            cells = (
+                pd.DataFrame({"geohash": hashes, "lat": center_lat, "lon": center_lon, "price_m2": df["PRICE_M2"].values})
+                .groupby("geohash")
+                .agg(lat=("lat", "first"), lon=("lon", "first"), listings=("price_m2", "size"), median_price_m2=("price_m2", "median"))
+                .reset_index()
+            )
+
+            requests = [
+                ReplaceOne(
+                    {"_id": f"{col_name}:{cell.geohash}"},
+                    {
+                        "operation": col_name,
+                        "precision": precision,
+                        "geohash": cell.geohash,
+                        "lat": float(cell.lat),
+                        "lon": float(cell.lon),
+                        "count": int(cell.listings),
+                        "median_price_m2": float(cell.median_price_m2),
+                        "built_at": built_at,
+                    },
+                    upsert=True,
+                )
+                for cell in cells.itertuples(index=False)
+            ]
+            cells_collection.bulk_write(requests, ordered=False)
+            col_stats[precision] = len(requests)
+
+        # Cells that no longer hold any listing
+        stale = cells_collection.delete_many({"operation": col_name, "built_at": {"$lt": built_at}})
+        stats[col_name] = {"cells": col_stats, "stale_removed": stale.deleted_count}
+        print(f"  {col_name}: heatmap cells per precision {col_stats}")
+
+    cells_collection.create_index([("operation", 1), ("precision", 1)])
+
+    print("✅ Price heatmap built.")
+    return json.dumps(stats)
@@ -6,6 +6,8 @@ from kfp.dsl import Dataset, Output, Input
 PROJECT_ID = os.getenv("PROJECT_ID", "inmuebles-app-437-v2")
 LOCATION = os.getenv("LOCATION", "us-central1")
 PIPELINE_ROOT = f"gs://{PROJECT_ID}-pipeline-roots/inmueblesapp"
+# Component containers are ephemeral, the archive has to outlive them to be replayed
+RAW_ARCHIVE_URI = f"{PIPELINE_ROOT}/raw_archive"
 
 # We use our custom pipeline image which contains all dependencies and the utils folder
 BASE_IMAGE = f"us-east1-docker.pkg.dev/{PROJECT_ID}/inmuebles-app/pipeline-runner:latest"
@@ -14,111 +16,200 @@ BASE_IMAGE = f"us-east1-docker.pkg.dev/{PROJECT_ID}/inmuebles-app/pipeline-runne
 def scrape_properties_op(
     operations: list,
     properties: list,
-    stats_out: Output[Dataset]
+    stats_out: Output[Dataset],
+    run_id: str = "",
+    incremental: bool = False,
+    stop_after_known_pages: int = 2,
+    cities: list = ['bogota'],
+    archive_raw: bool = True,
+    archive_uri: str = ""
 ):
-    from concurrent.futures import ProcessPoolExecutor, as_completed
     from qdrant_client.models import VectorParams, Distance, PointStruct
     from datetime import datetime
     from tqdm import tqdm
     import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import asyncio
+    from contextlib import nullcontext
     
-    from pipelines.utils.finca_raiz import OPERATION_INDEX, PROPERTY_INDEX, LOCAL, get_location, get_total_hits, get_total_pages, get_hits
+    from pipelines.utils.finca_raiz import LOCAL, MAX_CONCURRENCY, FincaRaizClient, get_total_pages
+    from pipelines.utils.streaming import StreamingPipeline
+    from pipelines.utils.writer import ListingWriter
+    from pipelines.utils.archive import ARCHIVE_URI, ArchiveWriter, RawArchive
+    from pipelines.utils.crawler import (
+        DEFAULT_ROWS, MAX_PARALLEL_SEGMENTS, AdaptiveConcurrency, CheckpointStore, Segment,
+        crawl_segment, crawl_segment_incremental, load_known_codes, plan_segments, probe_max_rows
+    )
     from backend.database import MongoSingleton
     from backend.utils import embed, preprocess_text, create_uuid_from_string
     
     import os
     os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
+    # Stage batch sizes and queue bounds of the fetch -> embed -> write pipeline
+    EMBED_BATCH_SIZE = 64
+    WRITE_BATCH_SIZE = 512
+    MAX_PENDING_PAGES = 16
+
     mongo_client = MongoSingleton(local=LOCAL).client
     mongodb = mongo_client["inmuebles_db"]
 
+    # Passing the run_id of an unfinished run (crash, preemption) resumes it instead of starting over
+    checkpoints = CheckpointStore(mongodb)
+    run = checkpoints.open_run(run_id or None)
+
     all_stats = []
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    timestamp = run["run_id"]
     scrape_time = datetime.now()
 
-    for operation in operations:
-        all_items = []
-        
-        for property in properties:
-            operation_index = OPERATION_INDEX[operation]
-            property_index = PROPERTY_INDEX[property]
-            location = get_location('bogota')
-            rows = 32
-
-            total_hits = get_total_hits(property_index, operation_index, location=location)
-            pages = get_total_pages(total_hits, rows)
-            pages=1
-            print(f"Operation: {operation}, Property: {property}")
-            print(f"Total properties: {total_hits}, Total pages: {pages}, Rows per Page: {rows}")
-
-            total_points = 0
+    writer = ListingWriter(mongodb)
+    archive = RawArchive(timestamp, archive_uri or ARCHIVE_URI) if archive_raw else None
+    write_stats = {"upserted": 0, "modified": 0, "price_changes": 0, "unchanged": 0}
+
+    def embed_items(operation: str, table: pa.Table) -> pa.Table:
+        rows = table.num_rows
+        table = (
+            table.append_column('_id', pa.array([create_uuid_from_string(code) for code in table.column('WEB_PROPERTY_CODE').to_pylist()]))
+                 .append_column('scraped_at', pa.repeat(pa.scalar(scrape_time, pa.timestamp('us')), rows))
+                 .append_column('batch_id', pa.repeat(pa.scalar(timestamp), rows))
+        )
+
+        # Listings whose content hash didn't change are neither re-embedded nor rewritten
+        changed = writer.select_changed(operation, table)
+        write_stats["unchanged"] += rows - changed.num_rows
+
+        descriptions = [preprocess_text(description or '') for description in changed.column('DESCRIPTION').to_pylist()]
+        vectors = embed(descriptions) if descriptions else []
+        return changed.drop_columns(['DESCRIPTION']).append_column('embedding', pa.array(vectors, pa.list_(pa.float32())))
+
+    def write_items(operation: str, table: pa.Table) -> None:
+        for key, value in writer.write(operation, table).items():
+            write_stats[key] += value
+
+    def checkpoint_pages(operation: str, pages: list) -> None:
+        by_segment = {}
+        for segment_id, page in pages:
+            by_segment.setdefault(segment_id, []).append(page)
+        for segment_id, segment_pages in by_segment.items():
+            checkpoints.mark_done(segment_id, timestamp, segment_pages)
+
+    async def scrape(client: FincaRaizClient, limiter: AdaptiveConcurrency, pipeline: StreamingPipeline, archive_writer: ArchiveWriter | None):
+        segments = await plan_segments(client, operations, properties, cities)
+        if run["rows"] is None:
+            # Nothing to probe on without segments, the default page size is kept
+            checkpoints.set_rows(run, await probe_max_rows(client, segments[0].operation_index, segments[0].location) if segments else DEFAULT_ROWS)
+        rows = run["rows"]
+
+        # Incremental runs stop paginating once pages only hold listings we already have
+        known_codes = {operation: load_known_codes(mongodb, operation) if incremental else set() for operation in operations}
+        if incremental:
+            print(f"Incremental mode: {', '.join(f'{len(codes)} {op}' for op, codes in known_codes.items())} listings already stored")
+
+        total_pages = sum(get_total_pages(segment.total_hits, rows) for segment in segments)
+        print(f"{len(segments)} segments, {sum(segment.total_hits for segment in segments)} properties, {total_pages} pages of {rows} rows")
+        progress = tqdm(total=total_pages, desc="Fetching data")
+        semaphore = asyncio.Semaphore(MAX_PARALLEL_SEGMENTS)
+
+        async def scrape_segment(segment: Segment):
+            operation, property = segment.operation, segment.property_type
+            pages = get_total_pages(segment.total_hits, rows)
+            segment_id = checkpoints.segment_id(timestamp, operation, property, segment.location["id"])
+            done_pages = set() if incremental else checkpoints.done_pages(segment_id)
+            progress.update(len(done_pages))
+
             success_count = 0
-            failure_count = 0
-
-            # Phase 1: Scrape
-            scraped_items = []
-            with ProcessPoolExecutor(max_workers=8) as executor:
-                futures = [
-                    executor.submit(get_hits, rows, page, property_index, operation_index, None, location) 
-                    for page in range(1, pages + 1)
-                ]                
-                for future in tqdm(as_completed(futures), total=pages, desc="Fetching data"):
-                    try:
-                        items = future.result()
-                        if items:
-                            for item in items:
-                                item['scraped_at'] = scrape_time
-                                item['batch_id'] = timestamp
-                            scraped_items.extend(items)
-                        success_count += 1
-                    except Exception as e:
-                        failure_count += 1
-                        print(f"Error fetching page data: {e}")
-
-            # Phase 2: Embed
-            if scraped_items:
-                descriptions = [preprocess_text(item.pop('DESCRIPTION', '')) for item in scraped_items]
-                ids = [create_uuid_from_string(item['WEB_PROPERTY_CODE']) for item in scraped_items]
-                vectors = embed(descriptions)
-
-                # Phase 3: Insert to MongoDB with Embeddings
-                for uid, vec, item in zip(ids, vectors, scraped_items):
-                    item['_id'] = uid
-                    item['embedding'] = vec
-
-                # Use ordered=False to silently skip items that already exist in DB
-                try:
-                    mongodb[operation].insert_many(scraped_items, ordered=False)
-                except Exception as e:
-                    print("MongoDB insert finished (some duplicate keys were safely ignored)")
-
-                total_points = len(scraped_items)
-                all_items.extend(scraped_items)
-
-            if len(all_items) > 0:
-                df = pd.DataFrame(all_items)
-                df['LATITUDE'] = pd.to_numeric(df['LATITUDE'], errors='coerce')
-                df['LONGITUDE'] = pd.to_numeric(df['LONGITUDE'], errors='coerce')
-                df['PRICE'] = pd.to_numeric(df['PRICE'], errors='coerce')
-                df['AREA'] = pd.to_numeric(df['AREA'], errors='coerce')
-
-                success_rate = None if (success_count + failure_count) == 0 else (success_count / (success_count + failure_count) * 100)
-            
-                signature = {
+            failed_pages = []
+            total_properties = 0
+            price_sum = 0.0
+            price_count = 0
+
+            # Raw responses are archived before parsing so they can be replayed when parsing changes
+            # (queued to the archive's writer task, compression and uploads stay off the event loop)
+            on_response = None
+            if archive_writer is not None:
+                on_response = lambda page, response: archive_writer.write(operation, property, segment.location["id"], page, response)
+
+            if incremental:
+                crawl = crawl_segment_incremental(client, limiter, rows, segment.total_hits, segment.property_index, segment.operation_index,
+                                                  segment.location, known_codes[operation], stop_after_known_pages, on_response)
+            else:
+                crawl = crawl_segment(client, limiter, rows, segment.total_hits, segment.property_index, segment.operation_index,
+                                      segment.location, done_pages, on_response)
+
+            async with semaphore:
+                async for page, batch, error in crawl:
+                    progress.update(1)
+                    if error is not None:
+                        failed_pages.append(page)
+                        print(f"Error fetching page {page} of {segment_id}: {error}")
+                        continue
+
+                    success_count += 1
+                    is_property = pc.fill_null(pc.equal(batch.column('PROPERTY_TYPE'), property), False)
+                    prices = pc.filter(batch.column('PRICE'), is_property)
+                    total_properties += pc.sum(is_property).as_py() or 0
+                    price_sum += pc.sum(prices).as_py() or 0.0
+                    price_count += pc.count(prices).as_py()
+                    # Blocks while the embed stage is behind, so fetching never runs ahead of memory
+                    await pipeline.put(operation, (segment_id, page), batch)
+
+            checkpoints.mark_failed(segment_id, timestamp, failed_pages)
+            failure_count = len(failed_pages)
+            if success_count + failure_count > 0:
+                success_rate = success_count / (success_count + failure_count) * 100
+                all_stats.append({
                     "timestamp": timestamp,
                     "property": property,
                     "operation": operation,
+                    "city": segment.city,
                     "pages_success": success_count,
                     "pages_failed": failure_count,
                     "success_rate": success_rate,
-                    'total_properties': len(df.loc[df['PROPERTY_TYPE'] == property]),
-                    'mean_price': df.loc[df['PROPERTY_TYPE'] == property, 'PRICE'].mean(),
-                }
-                all_stats.append(signature)
+                    'total_properties': total_properties,
+                    'mean_price': price_sum / price_count if price_count else None,
+                })
+
+        await asyncio.gather(*[scrape_segment(segment) for segment in segments])
+        progress.close()
+        print(f"Adaptive concurrency limit: {limiter.limit:.1f}, latency EWMA: {limiter.latency or 0:.2f}s")
+
+    async def main():
+        limiter = AdaptiveConcurrency(maximum=MAX_CONCURRENCY * 4)
+        pipeline = StreamingPipeline(
+            embed_items, write_items, checkpoint_pages,
+            embed_batch_size=EMBED_BATCH_SIZE, write_batch_size=WRITE_BATCH_SIZE, max_pending_pages=MAX_PENDING_PAGES
+        )
+        archive_writer = ArchiveWriter(archive, max_pending=MAX_PENDING_PAGES) if archive is not None else nullcontext()
+        async with FincaRaizClient(max_concurrency=MAX_CONCURRENCY * 4) as client:
+            async with pipeline, archive_writer as writer:
+                await scrape(client, limiter, pipeline, writer)
+        return pipeline
+
+    try:
+        pipeline = asyncio.run(main())
+    finally:
+        if archive is not None:
+            archive.close()
+            print(f"Archived {archive.pages_written} raw pages under {archive.root}/batch_id={timestamp}")
+    stored = pipeline.metrics["write"].items
+    print(f"Writes: {write_stats['upserted']} new, {write_stats['modified']} updated, "
+          f"{write_stats['unchanged']} unchanged (skipped), {write_stats['price_changes']} price observations")
+
+    print("Stage metrics:")
+    for stage in pipeline.report():
+        print(f"  {stage['stage']:>5}: {stage['items']} items in {stage['batches']} batches, {stage['items_per_sec']:.1f} items/s, "
+              f"busy {stage['busy_pct']:.0f}%, blocked {stage['blocked_pct']:.0f}%, queue mean {stage['queue_mean']:.1f} / max {stage['queue_max']}")
+
+    # Closed even with failed pages (recorded per segment), so the next scheduled run starts a fresh batch
+    failed_pages = sum(stat["pages_failed"] for stat in all_stats)
+    checkpoints.complete_run(run, failed_pages)
+    if failed_pages:
+        print(f"⚠️ {failed_pages} pages failed, resume with run_id={timestamp} to retry them")
 
     stats_df = pd.DataFrame(all_stats)
     stats_df.to_csv(stats_out.path, index=False)
-    print(f"✅ Stored {len(all_items)} properties")
+    print(f"✅ Stored {stored} properties")
 
 
 @dsl.component(base_image=BASE_IMAGE)
@@ -170,7 +261,7 @@ def scrapping_pipeline():
     ]
     
     # Step 1: Scrape Finca Raiz properties
-    scrape_task = scrape_properties_op(operations=operations, properties=property_types)
+    scrape_task = scrape_properties_op(operations=operations, properties=property_types, archive_uri=RAW_ARCHIVE_URI)
     
     # Step 2: Create the signature
     validate_task = validate_scrapping_signature_op(current_stats_in=scrape_task.outputs['stats_out'])
@@ -6,11 +6,16 @@ PROJECT_ID = os.getenv("PROJECT_ID", "inmuebles-app-437-v2")
 LOCATION = os.getenv("LOCATION", "us-central1")
 PIPELINE_ROOT = f"gs://{PROJECT_ID}-pipeline-roots/inmueblesapp"
 BASE_IMAGE = f"us-east1-docker.pkg.dev/{PROJECT_ID}/inmuebles-app/pipeline-runner:latest"
+# Component containers are ephemeral, caches only hit across runs when kept under the pipeline root
+TRAINING_SNAPSHOT_URI = f"{PIPELINE_ROOT}/snapshots"
+HPO_STUDIES_URI = f"{PIPELINE_ROOT}/studies"
 
 @dsl.component(base_image=BASE_IMAGE)
-def train_model_op(model_type: str = "xgboost") -> str:
+def train_model_op(model_type: str = "xgboost", sampler: str = "tpe", pruner: str = "median", warm_start: bool = True,
+                   snapshot_uri: str = "", studies_uri: str = "") -> str:
     import pandas as pd
     import numpy as np
+    import pyarrow as pa
     import mlflow
     import json
     import os
@@ -28,6 +33,9 @@ def train_model_op(model_type: str = "xgboost") -> str:
     from pipelines.utils import evaluate as ev
     from pipelines.utils import preprocess as pp
     from pipelines.utils import optimize as op
+    from pipelines.utils import rules as rl
+    from pipelines.utils import loader as ld
+    from pipelines.utils import studies as st
     from backend.database import MongoSingleton
 
     # === 1. Load Data ===
@@ -40,15 +48,22 @@ def train_model_op(model_type: str = "xgboost") -> str:
         db = client["inmuebles_db"]
         print("📂 Loading data from MongoDB...")
         
-        df_arriendo = pd.DataFrame(list(db["Arriendo"].find({}, {'_id': 0, 'batch_id': 0, 'scraped_at': 0, 'embedding': 0})))
-        df_venta = pd.DataFrame(list(db["Venta"].find({}, {'_id': 0, 'batch_id': 0, 'scraped_at': 0, 'embedding': 0})))
-        
-        df = pd.concat([df_arriendo, df_venta], ignore_index=True)
+        # Only the config.json fields, streamed into typed Arrow batches and cached as a Parquet
+        # snapshot per latest batch_id, so repeat trainings memory-map it instead of re-querying
+        tables, snapshots = [], {}
+        for col_name in ["Arriendo", "Venta"]:
+            table, info = ld.load_snapshot(db[col_name], uri=snapshot_uri or ld.SNAPSHOT_URI)
+            tables.append(table)
+            snapshots[col_name] = info["batch_id"]
+            print(f"  {col_name}: {table.num_rows} rows, batch {info['batch_id']} ({'cached snapshot' if info['cached'] else 'loaded from MongoDB'})")
+
+        df = pa.concat_tables(tables).to_pandas()
         
         df['PRICE'] = pd.to_numeric(df['PRICE'], errors='coerce')
         df['AREA'] = pd.to_numeric(df['AREA'], errors='coerce')
         print('a')
         mlflow.log_param("data_source", "mongodb")
+        mlflow.log_param("snapshot_batches", json.dumps(snapshots))
         print('b')
     except Exception as e:
         print(f"⚠️ MongoDB load failed: {e}")
@@ -82,11 +97,8 @@ def train_model_op(model_type: str = "xgboost") -> str:
     df[categorical_features] = df[categorical_features].astype('category')
     print(3)
     # === 4. Manual Filtering ===
-    df = df.loc[df['FLOOR'] != 202]
-    df = df.loc[df['STRATUM'] != 101]
-    apartment_mask = df['PROPERTY_TYPE'].isin(['Apartamento', 'Apartaestudio'])
-    df.loc[apartment_mask] = df.loc[apartment_mask & (df['AREA'] < 400) & (df['AREA'] > 0) & (df['PRICE'] < 20_000_000) & (df['PRICE'] > 100_000)]
-    df.dropna(inplace=True)
+    # Same cleaning rules remove_erroneous_values_op deletes with, compiled to one vectorized mask
+    df = df.loc[~rl.compile_mask(df, rl.load_rules())]
     print(4)
     # === 5. Split Data ===
     X_train_raw, X_test_raw, y_train_raw, y_test = train_test_split(df[all_features], df[y_column], test_size=0.2, random_state=42)
@@ -121,9 +133,24 @@ def train_model_op(model_type: str = "xgboost") -> str:
     model_class = models_map[model_type]
     
     print(f"🔍 Optimizing {model_type} hyperparameters...")
-    best_params = op.optimize_hyperparameters(objective_func, X_train_processed, y_train_processed.ravel(), n_trials=50)
+    if warm_start:
+        # Studies persist per model type and feature set, each run starts from the previous best trials
+        # and only runs a short search when the raw data barely moved since then
+        fingerprint = st.data_fingerprint(pd.concat([X_train_raw[numeric_features], y_train_raw], axis=1))
+        study, search = st.warm_started_search(objective_func, X_train_processed, y_train_processed.ravel(),
+                                               st.study_key(model_type, all_features), fingerprint,
+                                               n_trials=50, sampler=sampler, pruner=pruner, uri=studies_uri or st.STUDIES_URI)
+        best_params = op.best_params(study)
+        print(f"  {search['n_trials']} trials, {search['warm_start_trials']} warm-started from {search['previous_study']} (drift {search['drift']})")
+        mlflow.log_params({"hpo_study": search["study"], "hpo_trials": search["n_trials"], "hpo_warm_start_trials": search["warm_start_trials"]})
+        if search["drift"] is not None and np.isfinite(search["drift"]):
+            mlflow.log_metric("hpo_data_drift", search["drift"])
+    else:
+        best_params = op.optimize_hyperparameters(objective_func, X_train_processed, y_train_processed.ravel(), n_trials=50,
+                                                  sampler=sampler, pruner=pruner)
     
     mlflow.log_params(best_params)
+    mlflow.log_params({"hpo_sampler": sampler, "hpo_pruner": pruner})
     mlflow.log_param("model_type", model_type)
     
     print(f"🏋️ Training {model_type} with best params...")
@@ -156,8 +183,9 @@ def train_model_op(model_type: str = "xgboost") -> str:
 
 
 # We import the components from the other files at the top level to avoid KFP nested pipeline errors
-from pipelines.scrapping import scrape_properties_op
-from pipelines.cleaning import remove_erroneous_values_op, cap_prices_by_property_type_op, cap_numeric_fields_op
+from pipelines.scrapping import RAW_ARCHIVE_URI, scrape_properties_op
+from pipelines.cleaning import remove_duplicates_by_source_op, remove_erroneous_values_op, cap_outliers_op
+from pipelines.aggregates import build_price_heatmap_op
 
 @dsl.pipeline(
     name="inmueblesapp-end-to-end-pipeline",
@@ -168,13 +196,17 @@ def end_to_end_pipeline(project_id: str = PROJECT_ID, model_type: str = "xgboost
     # Step 1: Scrape
     scrape_task = scrape_properties_op(
         operations=['Arriendo', 'Venta'], 
-        properties=['Casa', 'Apartamento', 'Lote', 'Local', 'Oficina', 'Finca', 'Parqueadero']
+        properties=['Casa', 'Apartamento', 'Lote', 'Local', 'Oficina', 'Finca', 'Parqueadero'],
+        archive_uri=RAW_ARCHIVE_URI
     )
     
     # Step 2: Clean (We string them together using .after() to ensure chronological execution in the cloud)
-    erroneous_task = remove_erroneous_values_op(collections=['Arriendo', 'Venta'], local=False).after(scrape_task)
-    price_task = cap_prices_by_property_type_op(collections=['Arriendo', 'Venta'], local=False).after(erroneous_task)
-    numeric_task = cap_numeric_fields_op(collections=['Arriendo', 'Venta'], local=False).after(price_task)
+    dedup_task = remove_duplicates_by_source_op(collections=['Arriendo', 'Venta'], local=False).after(scrape_task)
+    erroneous_task = remove_erroneous_values_op(collections=['Arriendo', 'Venta'], local=False).after(dedup_task)
+    cap_task = cap_outliers_op(collections=['Arriendo', 'Venta'], local=False).after(erroneous_task)
+
+    # Step 2b: Pre-aggregate the Dashboard heatmap cells from the cleaned listings
+    heatmap_task = build_price_heatmap_op(collections=['Arriendo', 'Venta'], local=False).after(cap_task)
     
     # Step 3: Train
-    train_task = train_model_op(model_type=model_type).after(numeric_task)
\ No newline at end of file
+    train_task = train_model_op(model_type=model_type, snapshot_uri=TRAINING_SNAPSHOT_URI, studies_uri=HPO_STUDIES_URI).after(cap_task)
\ No newline at end of file
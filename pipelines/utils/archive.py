@@ -0,0 +1,162 @@
+import asyncio
+import io
+import json
+import os
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Iterator
+
+import pyarrow as pa
+import pyarrow.fs as pafs
+
+from .finca_raiz import LISTING_SCHEMA, parse_hits_batch
+
+# Local path or any URI pyarrow understands (gs://bucket/raw_archive, s3://...)
+ARCHIVE_URI = os.getenv("RAW_ARCHIVE_URI", "data/raw_archive")
+ARCHIVE_COMPRESSION = "zstd"
+ARCHIVE_SUFFIX = ".jsonl.zst"
+
+
+def _filesystem(uri: str) -> tuple[pafs.FileSystem, str]:
+    if "://" not in uri:
+        return pafs.LocalFileSystem(), os.path.abspath(uri)
+    return pafs.FileSystem.from_uri(uri)
+
+
+def _partition_value(value) -> str:
+    return re.sub(r"[^\w.-]", "_", str(value))
+
+
+class RawArchive:
+    """
+    Every raw search response of a scrape, as zstd-compressed JSON lines partitioned like
+    `<root>/batch_id=<batch>/segment=<operation>-<property>-<location>/part-<uuid>.jsonl.zst`.
+
+    Parsing can then be re-run offline with `replay_archive` when the item schema changes,
+    without scraping again. Each open segment keeps one compressed stream, closed by `close`.
+    """
+
+    def __init__(self, batch_id: str, uri: str = ARCHIVE_URI):
+        self.fs, self.root = _filesystem(uri)
+        self.batch_id = batch_id
+        self.pages_written = 0
+        self._streams: dict[str, pa.NativeFile] = {}
+
+    def __enter__(self) -> 'RawArchive':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _stream(self, operation: str, property: str, location_id) -> pa.NativeFile:
+        segment = "-".join(_partition_value(v) for v in (operation, property, location_id))
+        if segment not in self._streams:
+            directory = f"{self.root}/batch_id={_partition_value(self.batch_id)}/segment={segment}"
+            self.fs.create_dir(directory, recursive=True)
+            # A resumed run gets its own part file instead of overwriting the first attempt's
+            path = f"{directory}/part-{uuid.uuid4().hex[:12]}{ARCHIVE_SUFFIX}"
+            self._streams[segment] = self.fs.open_output_stream(path, compression=ARCHIVE_COMPRESSION)
+        return self._streams[segment]
+
+    def write(self, operation: str, property: str, location_id, page: int, response: dict):
+        record = {
+            "operation": operation,
+            "property": property,
+            "location_id": location_id,
+            "page": page,
+            "fetched_at": datetime.now().isoformat(),
+            "response": response,
+        }
+        self._stream(operation, property, location_id).write(json.dumps(record).encode() + b"\n")
+        self.pages_written += 1
+
+    def close(self):
+        for stream in self._streams.values():
+            stream.close()
+        self._streams.clear()
+
+
+class ArchiveWriter:
+    """
+    Feeds a `RawArchive` from the event loop. `write` only queues the response, a single task
+    drains the queue and writes each record in a worker thread (compression and remote uploads
+    never block the fetches), one at a time since the archive's streams aren't thread-safe.
+    `write` blocks once `max_pending` responses are queued.
+    """
+
+    def __init__(self, archive: RawArchive, max_pending: int = 16):
+        self.archive = archive
+        self._queue = asyncio.Queue(maxsize=max_pending)
+        self._task = None
+
+    async def __aenter__(self) -> 'ArchiveWriter':
+        self._task = asyncio.create_task(self._drain())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            return
+        await self._queue.put(None)
+        await self._task
+
+    async def _drain(self):
+        while (record := await self._queue.get()) is not None:
+            await asyncio.to_thread(self.archive.write, *record)
+
+    async def write(self, operation: str, property: str, location_id, page: int, response: dict):
+        # Wait on the writer too: if it died the queue never drains and we'd block forever
+        put = asyncio.ensure_future(self._queue.put((operation, property, location_id, page, response)))
+        await asyncio.wait([put, self._task], return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            raise RuntimeError("Raw archive writer stopped early") from self._task.exception()
+
+
+def list_batches(uri: str = ARCHIVE_URI) -> list[str]:
+    fs, root = _filesystem(uri)
+    if fs.get_file_info(root).type == pafs.FileType.NotFound:
+        return []
+    infos = fs.get_file_info(pafs.FileSelector(root))
+    return sorted(info.base_name.split("=", 1)[1] for info in infos if info.base_name.startswith("batch_id="))
+
+
+def list_archive_files(batch_id: str, uri: str = ARCHIVE_URI) -> list[str]:
+    fs, root = _filesystem(uri)
+    selector = pafs.FileSelector(f"{root}/batch_id={_partition_value(batch_id)}", recursive=True, allow_not_found=True)
+    return sorted(info.path for info in fs.get_file_info(selector) if info.path.endswith(ARCHIVE_SUFFIX))
+
+
+def read_archive_records(path: str, uri: str = ARCHIVE_URI) -> Iterator[dict]:
+    fs, _ = _filesystem(uri)
+    with fs.open_input_stream(path, compression=ARCHIVE_COMPRESSION) as stream:
+        for line in io.TextIOWrapper(stream, encoding="utf-8"):
+            yield json.loads(line)
+
+
+def parse_archive_file(path: str, uri: str = ARCHIVE_URI) -> tuple[str, pa.Table]:
+    """
+    Re-parse one archived segment file into a `LISTING_SCHEMA` table, plus the `scraped_at`
+    column (when each page was fetched) that `scrape_properties_op` would have added.
+    """
+    operation = None
+    batches = []
+    fetched_at = []
+    for record in read_archive_records(path, uri):
+        operation = record["operation"]
+        batch = parse_hits_batch(record["response"])
+        batches.append(batch)
+        fetched_at += [datetime.fromisoformat(record["fetched_at"])] * batch.num_rows
+
+    table = pa.Table.from_batches(batches, schema=LISTING_SCHEMA)
+    return operation, table.append_column("scraped_at", pa.array(fetched_at, pa.timestamp("us")))
+
+
+def replay_archive(batch_id: str, uri: str = ARCHIVE_URI, workers: int | None = None) -> Iterator[tuple[str, pa.Table]]:
+    """Parse every archived file of a batch in worker processes, yielding (operation, table) per file."""
+    files = list_archive_files(batch_id, uri)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(parse_archive_file, files, [uri] * len(files))
@@ -0,0 +1,145 @@
+from datetime import datetime
+
+from .sketches import DEFAULT_RELATIVE_ACCURACY, DDSketch, bucket_expression
+
+CAP_FIELDS = ["PRICE", "BUILT_AREA", "AREA", "GARAGE", "BATHROOMS", "ROOMS"]
+CAP_PERCENTILE = 0.99
+CLEANING_STATE_COLLECTION = "cleaning_state"
+
+
+class CleaningState:
+    """
+    Per collection high-water mark (latest `scraped_at` already cleaned) and the per-type
+    percentile sketches of every listing cleaned so far, each counted once, stored in `cleaning_state`.
+    """
+
+    def __init__(self, db):
+        self.collection = db[CLEANING_STATE_COLLECTION]
+
+    def load(self, name: str) -> dict | None:
+        return self.collection.find_one({"_id": name})
+
+    def watermark(self, name: str) -> datetime | None:
+        state = self.load(name)
+        return state["watermark"] if state else None
+
+    def save(self, name: str, watermark: datetime | None, sketches: dict[str, dict[str, DDSketch]]):
+        self.collection.replace_one({"_id": name}, {
+            "_id": name,
+            "watermark": watermark,
+            "sketches": {ptype: {field: sketch.to_dict() for field, sketch in fields.items()} for ptype, fields in sketches.items()},
+            "updated_at": datetime.now(),
+        }, upsert=True)
+
+
+def window_filter(start: datetime | None, end: datetime | None = None, field: str = "scraped_at") -> dict:
+    """Documents scraped after `start` (up to `end`), everything when there is no watermark yet."""
+    if start is None:
+        return {}
+    bounds = {"$gt": start}
+    if end is not None:
+        bounds["$lte"] = end
+    return {field: bounds}
+
+
+def sketch_pipeline(fields: list[str], match: dict, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> list[dict]:
+    """
+    Sketch buckets of every field for every property type, computed server-side: the result
+    is one small (type, field, bucket, count) row per non-empty bucket, not the raw values.
+    """
+    return [
+        {"$match": {**match, "PROPERTY_TYPE": {"$type": "string"}}},
+        {"$project": {"PROPERTY_TYPE": 1, "values": [{"field": field, "value": f"${field}"} for field in fields]}},
+        {"$unwind": "$values"},
+        {"$match": {"values.value": {"$type": "number"}}},
+        {"$group": {
+            "_id": {"type": "$PROPERTY_TYPE", "field": "$values.field", "key": bucket_expression("$values.value", relative_accuracy)},
+            "count": {"$sum": 1},
+        }},
+    ]
+
+
+def collect_sketches(collection, fields: list[str], match: dict, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> dict[str, dict[str, DDSketch]]:
+    sketches = {}
+    for doc in collection.aggregate(sketch_pipeline(fields, match, relative_accuracy), allowDiskUse=True):
+        key = doc["_id"]
+        sketch = sketches.setdefault(key["type"], {}).setdefault(key["field"], DDSketch(relative_accuracy))
+        sketch.add_bucket(int(key["key"]) if key.get("key") is not None else None, doc["count"])
+    return sketches
+
+
+def merge_sketches(into: dict[str, dict[str, DDSketch]], new: dict[str, dict[str, DDSketch]]):
+    for ptype, fields in new.items():
+        for field, sketch in fields.items():
+            if field in into.setdefault(ptype, {}):
+                into[ptype][field].merge(sketch)
+            else:
+                into[ptype][field] = sketch
+
+
+def caps_from_sketches(sketches: dict[str, dict[str, DDSketch]], percentile: float = CAP_PERCENTILE) -> dict[str, dict[str, float]]:
+    """{property_type: {field: cap}}, fields without any numeric value are left out."""
+    caps = {}
+    for ptype, fields in sketches.items():
+        type_caps = {field: sketch.quantile(percentile) for field, sketch in fields.items() if sketch.count}
+        if type_caps:
+            caps[ptype] = type_caps
+    return caps
+
+
+def _capped(field: str, caps: dict[str, dict[str, float]]) -> dict:
+    branches = [
+        {"case": {"$eq": ["$PROPERTY_TYPE", ptype]}, "then": {"$min": [f"${field}", type_caps[field]]}}
+        for ptype, type_caps in caps.items() if field in type_caps
+    ]
+    clamped = {"$max": [0, {"$switch": {"branches": branches, "default": f"${field}"}}]} if branches else {"$max": [0, f"${field}"]}
+    # Missing and non-numeric values are left as they are
+    return {"$cond": [{"$isNumber": f"${field}"}, clamped, f"${field}"]}
+
+
+def cap_update(caps: dict[str, dict[str, float]], fields: list[str]) -> tuple[dict, list[dict]]:
+    """
+    (filter, pipeline update) applying every cap of every type in one `update_many`:
+    negatives become 0 and values above their type's cap become the cap. The filter only
+    matches documents that actually need a change, so untouched documents aren't rewritten.
+    """
+    conditions = [{field: {"$lt": 0}} for field in fields]
+    conditions += [
+        {"PROPERTY_TYPE": ptype, field: {"$gt": cap}}
+        for ptype, type_caps in caps.items() for field, cap in type_caps.items() if field in fields
+    ]
+    return {"$or": conditions}, [{"$set": {field: _capped(field, caps) for field in fields}}]
+
+
+def cap_collection(collection, state: CleaningState, fields: list[str] = CAP_FIELDS,
+                   percentile: float = CAP_PERCENTILE, full_rebuild: bool = False) -> dict:
+    """
+    Cap only the documents scraped since the collection's watermark, with caps taken from the
+    historical sketches merged with the ones of the listings first seen since, then advance the watermark.
+    `full_rebuild` drops the state and re-sketches and re-caps the whole collection.
+    """
+    collection.create_index("scraped_at")
+    collection.create_index("first_seen_at")
+    previous = None if full_rebuild else state.load(collection.name)
+    start = previous["watermark"] if previous else None
+
+    # Fix the window's upper bound first, so documents landing meanwhile wait for the next run
+    latest = collection.find_one({"scraped_at": {"$type": "date"}}, {"scraped_at": 1}, sort=[("scraped_at", -1)])
+    end = latest["scraped_at"] if latest else start
+    window = window_filter(start, end)
+
+    sketches = {}
+    if previous is not None:
+        sketches = {ptype: {field: DDSketch.from_dict(data) for field, data in fields.items()} for ptype, fields in previous["sketches"].items()}
+    # Rescraped listings come back into the window to be re-capped, but their values are already in
+    # the historical sketches: only the listings inserted meanwhile are added, so none is counted twice
+    merge_sketches(sketches, collect_sketches(collection, fields, window_filter(start, end, field="first_seen_at")))
+    caps = caps_from_sketches(sketches, percentile)
+
+    modified = 0
+    if caps:
+        query, update = cap_update(caps, fields)
+        modified = collection.update_many({"$and": [window, query]} if window else query, update).modified_count
+
+    state.save(collection.name, end, sketches)
+    return {"caps": caps, "modified": modified, "incremental": previous is not None, "watermark": end}
@@ -0,0 +1,280 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from pymongo import ASCENDING
+
+from .finca_raiz import FincaRaizClient, OPERATION_INDEX, ORDER_DEFAULT, ORDER_NEWEST_FIRST, PROPERTY_INDEX, get_total_pages, parse_hits_batch
+
+# Page sizes tried (largest first) when probing what the search API accepts
+ROWS_CANDIDATES = (200, 100, 64, 50, 40, 32)
+DEFAULT_ROWS = 32
+
+CHECKPOINT_COLLECTION = "scrape_checkpoints"
+
+# The partial unique (SOURCE, WEB_PROPERTY_CODE) index can't serve an unfiltered find, this one covers it
+KNOWN_CODES_INDEX = [("WEB_PROPERTY_CODE", ASCENDING)]
+KNOWN_CODES_PROJECTION = {"_id": 0, "WEB_PROPERTY_CODE": 1}
+
+# Segments crawled at the same time, pages of all of them share the adaptive limiter
+MAX_PARALLEL_SEGMENTS = 4
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD concurrency limit: grows by one slot per window of healthy requests and halves
+    when latency goes above `target_latency` or a request fails.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 32, target_latency: float = 2.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self.latency = None  # EWMA, seconds
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        async with self._condition:
+            self.in_flight -= 1
+            # Only wake as many waiters as there are free slots (more than one if the limit grew)
+            self._condition.notify(max(0, int(self.limit) - self.in_flight))
+
+    def record(self, latency: float, ok: bool):
+        self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        now = time.monotonic()
+
+        if not ok or self.latency > self.target_latency:
+            # Decrease at most once per latency period so one slow burst doesn't collapse the limit
+            if now - self._last_decrease > max(self.latency, 0.1):
+                self.limit = max(self.minimum, self.limit / 2)
+                self._last_decrease = now
+        else:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+
+class CheckpointStore:
+    """Pages already persisted per crawl segment, stored in Mongo so a crashed run can resume."""
+
+    def __init__(self, db):
+        self.collection = db[CHECKPOINT_COLLECTION]
+        self.collection.create_index([("run_id", ASCENDING)])
+
+    @staticmethod
+    def segment_id(run_id: str, operation: str, property: str, location_id) -> str:
+        return f"{run_id}:{operation}:{property}:{location_id}"
+
+    def open_run(self, run_id: str | None = None) -> dict:
+        """
+        Resume `run_id` if it exists, otherwise start a new run. Runs are only ever resumed
+        explicitly, a scheduled run without a `run_id` always scrapes under a fresh batch.
+        """
+        if run_id:
+            run = self.collection.find_one({"_id": f"run:{run_id}"})
+            if run is not None:
+                print(f"♻️ Resuming scrape run {run['run_id']}")
+                return run
+
+        run_id = run_id or datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        run = {"_id": f"run:{run_id}", "kind": "run", "run_id": run_id, "rows": None, "completed": False, "started_at": datetime.now()}
+        self.collection.insert_one(run)
+        return run
+
+    def set_rows(self, run: dict, rows: int):
+        # Page numbers only stay meaningful across a resume if the page size never changes
+        self.collection.update_one({"_id": run["_id"]}, {"$set": {"rows": rows}})
+        run["rows"] = rows
+
+    def complete_run(self, run: dict, failed_pages: int = 0):
+        """Close the run. With failed pages it is kept as "partial" and can be resumed by `run_id` to retry them."""
+        status = "partial" if failed_pages else "complete"
+        self.collection.update_one(
+            {"_id": run["_id"]},
+            {"$set": {"completed": True, "status": status, "failed_pages": failed_pages, "completed_at": datetime.now()}}
+        )
+
+    def done_pages(self, segment_id: str) -> set[int]:
+        doc = self.collection.find_one({"_id": segment_id}, {"pages": 1})
+        return set(doc["pages"]) if doc else set()
+
+    def mark_done(self, segment_id: str, run_id: str, pages: list[int]):
+        if pages:
+            self.collection.update_one(
+                {"_id": segment_id},
+                {
+                    "$addToSet": {"pages": {"$each": pages}},
+                    "$pull": {"failed_pages": {"$in": pages}},
+                    "$set": {"run_id": run_id, "kind": "segment", "updated_at": datetime.now()},
+                },
+                upsert=True
+            )
+
+    def mark_failed(self, segment_id: str, run_id: str, pages: list[int]):
+        if pages:
+            self.collection.update_one(
+                {"_id": segment_id},
+                {"$addToSet": {"failed_pages": {"$each": pages}}, "$set": {"run_id": run_id, "kind": "segment", "updated_at": datetime.now()}},
+                upsert=True
+            )
+
+
+@dataclass
+class Segment:
+    operation: str
+    property_type: str
+    city: str
+    location: dict
+    total_hits: int
+
+    @property
+    def operation_index(self) -> int:
+        return OPERATION_INDEX[self.operation]
+
+    @property
+    def property_index(self) -> int:
+        return PROPERTY_INDEX[self.property_type]
+
+
+async def plan_segments(client: FincaRaizClient, operations: list, properties: list, cities: list) -> list[Segment]:
+    """
+    Every (operation, property type, city) segment with its hit count, largest first.
+    Locations are resolved once per city and hit counts are fetched concurrently, so
+    planning costs one round trip of latency instead of one per segment.
+    """
+    locations = dict(zip(cities, await asyncio.gather(*[client.get_location(city) for city in cities])))
+    keys = [(operation, property, city) for operation in operations for property in properties for city in cities]
+    totals = await asyncio.gather(*[
+        client.get_total_hits(PROPERTY_INDEX[property], OPERATION_INDEX[operation], location=locations[city])
+        for operation, property, city in keys
+    ])
+
+    segments = [Segment(operation, property, city, locations[city], total) for (operation, property, city), total in zip(keys, totals)]
+    # Longest segments start first so the crawl doesn't end waiting on one big straggler
+    return sorted(segments, key=lambda segment: segment.total_hits, reverse=True)
+
+
+def load_known_codes(db, operation: str) -> set:
+    """
+    Every WEB_PROPERTY_CODE already stored for an operation. The hinted index covers the query,
+    so only its keys are read, never the documents and their embeddings.
+    """
+    collection = db[operation]
+    collection.create_index(KNOWN_CODES_INDEX)  # No-op once it exists
+    cursor = collection.find({}, KNOWN_CODES_PROJECTION).hint(KNOWN_CODES_INDEX)
+    return {doc["WEB_PROPERTY_CODE"] for doc in cursor if doc.get("WEB_PROPERTY_CODE") is not None}
+
+
+async def probe_max_rows(client: FincaRaizClient, operation_index: int, location: dict) -> int:
+    """Largest page size the API honours, probed on apartments which always have plenty of hits."""
+    property_index = PROPERTY_INDEX['Apartamento']
+    total_hits = await client.get_total_hits(property_index, operation_index, location=location)
+
+    for rows in ROWS_CANDIDATES:
+        try:
+            items = await client.get_hits(rows, 1, property_index, operation_index, None, location)
+        except Exception:
+            continue
+        if len(items) == min(rows, total_hits):
+            return rows
+    return DEFAULT_ROWS
+
+
+async def fetch_page(client: FincaRaizClient, limiter: AdaptiveConcurrency, rows: int, page: int,
+                     property_index: int, operation_index: int, location: dict, order: int = ORDER_DEFAULT,
+                     on_response: Callable[[int, dict], Awaitable[None]] | None = None):
+    """
+    One page through the adaptive limiter, returned as (page, batch, error) instead of raising,
+    with the hits parsed into an Arrow record batch.
+    `await on_response(page, response)` sees the raw response before it is parsed.
+    """
+    async with limiter:
+        start = time.monotonic()
+        try:
+            response = await client.search(rows, page, property_index, operation_index, None, location, order)
+            limiter.record(time.monotonic() - start, ok=True)
+        except Exception as e:
+            limiter.record(time.monotonic() - start, ok=False)
+            return page, None, e
+
+    try:
+        if on_response is not None:
+            await on_response(page, response)
+        return page, parse_hits_batch(response), None
+    except Exception as e:
+        return page, None, e
+
+
+async def crawl_segment(client: FincaRaizClient, limiter: AdaptiveConcurrency, rows: int, total_hits: int,
+                        property_index: int, operation_index: int, location: dict, skip_pages: set[int] = frozenset(),
+                        on_response: Callable[[int, dict], Awaitable[None]] | None = None, workers: int | None = None):
+    """
+    Fetch every page of one (operation, property type, location) segment not listed in `skip_pages`.
+    Yields (page, batch, error) as pages complete, concurrency follows the adaptive limiter.
+
+    A fixed pool of `workers` tasks (default: the limiter's maximum) takes page numbers one at a
+    time and hands each result over through a queue of the same size before taking the next, so
+    at most 2 x `workers` pages are held at once. A slow consumer slows the crawl down instead of
+    letting fetched pages pile up.
+    """
+    pages = [page for page in range(1, get_total_pages(total_hits, rows) + 1) if page not in skip_pages]
+    if not pages:
+        return
+
+    workers = min(workers or limiter.maximum, len(pages))
+    remaining = iter(pages)
+    results = asyncio.Queue(maxsize=workers)
+
+    async def worker():
+        # The iterator is shared, each page is taken by exactly one worker
+        for page in remaining:
+            await results.put(await fetch_page(client, limiter, rows, page, property_index, operation_index, location, on_response=on_response))
+
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    try:
+        for _ in pages:
+            yield await results.get()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def crawl_segment_incremental(client: FincaRaizClient, limiter: AdaptiveConcurrency, rows: int, total_hits: int,
+                                    property_index: int, operation_index: int, location: dict,
+                                    known_codes: set, stop_after_known_pages: int = 2,
+                                    on_response: Callable[[int, dict], Awaitable[None]] | None = None):
+    """
+    Walk a segment newest-first, in page order, and stop once `stop_after_known_pages`
+    consecutive pages hold only listings in `known_codes`. Pages are requested in waves
+    as wide as the current concurrency limit, so at most one wave is fetched past the stop.
+    Yields (page, batch, error) in page order.
+    """
+    total_pages = get_total_pages(total_hits, rows)
+    known_streak = 0
+    page = 1
+
+    while page <= total_pages:
+        wave = range(page, min(total_pages, page + max(1, int(limiter.limit)) - 1) + 1)
+        page = wave[-1] + 1
+
+        fetches = [fetch_page(client, limiter, rows, p, property_index, operation_index, location, ORDER_NEWEST_FIRST, on_response) for p in wave]
+        for result in await asyncio.gather(*fetches):
+            _, batch, error = result
+            all_known = error is None and batch.num_rows > 0 and all(
+                code in known_codes for code in batch.column("WEB_PROPERTY_CODE").to_pylist()
+            )
+            known_streak = known_streak + 1 if all_known else 0
+
+            yield result
+            if known_streak >= stop_after_known_pages:
+                return
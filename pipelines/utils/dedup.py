@@ -0,0 +1,60 @@
+from pymongo import ASCENDING
+
+DEDUP_KEY = ["SOURCE", "WEB_PROPERTY_CODE"]
+UNIQUE_INDEX_NAME = "source_code_unique"
+DELETE_CHUNK_SIZE = 10_000
+
+
+def losing_ids_pipeline() -> list[dict]:
+    """
+    Every `_id` that loses its (SOURCE, WEB_PROPERTY_CODE) group, in one aggregation.
+    The most recently scraped document of each group is kept ($top, MongoDB 5.2+).
+    """
+    return [
+        {"$match": {field: {"$exists": True} for field in DEDUP_KEY}},
+        {"$group": {
+            "_id": {field: f"${field}" for field in DEDUP_KEY},
+            "keep": {"$top": {"sortBy": {"scraped_at": -1, "_id": -1}, "output": "$_id"}},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$project": {"_id": 0, "losers": {"$filter": {"input": "$ids", "cond": {"$ne": ["$$this", "$keep"]}}}}},
+        {"$unwind": "$losers"},
+    ]
+
+
+def has_unique_index(collection) -> bool:
+    return UNIQUE_INDEX_NAME in collection.index_information()
+
+
+def ensure_unique_index(collection):
+    # Partial, so documents missing the key (never written by the scraper) don't collide on null
+    collection.create_index(
+        [(field, ASCENDING) for field in DEDUP_KEY],
+        name=UNIQUE_INDEX_NAME,
+        unique=True,
+        partialFilterExpression={field: {"$exists": True} for field in DEDUP_KEY},
+    )
+
+
+def remove_duplicates(collection, chunk_size: int = DELETE_CHUNK_SIZE) -> dict:
+    """
+    Delete the losing duplicates of a collection in chunked `delete_many` calls, then create
+    the unique index. Once the index exists duplicates can't be written, so the scan is skipped.
+    """
+    if has_unique_index(collection):
+        return {"deleted_count": 0, "skipped": True}
+
+    deleted_count = 0
+    chunk = []
+    for doc in collection.aggregate(losing_ids_pipeline(), allowDiskUse=True):
+        chunk.append(doc["losers"])
+        if len(chunk) >= chunk_size:
+            deleted_count += collection.delete_many({"_id": {"$in": chunk}}).deleted_count
+            chunk = []
+    if chunk:
+        deleted_count += collection.delete_many({"_id": {"$in": chunk}}).deleted_count
+
+    ensure_unique_index(collection)
+    return {"deleted_count": deleted_count, "skipped": False}
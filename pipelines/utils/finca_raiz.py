@@ -1,9 +1,17 @@
+import asyncio
+import math
+import time
 import requests
+import httpx
 import os
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 from qdrant_client.models import PointStruct
 import re
 from dotenv import load_dotenv
 from fastembed import TextEmbedding
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
 import uuid
 load_dotenv()
 
@@ -44,28 +52,43 @@ INDEX_ANTIQUITY = {value:key for key, value in ANTIQUITY_INDEX.items()}
 
 LOCAL = os.getenv("LOCAL", "true").lower() == "true"
 
+API_URL = os.getenv("FINCA_RAIZ_API_URL", "https://search-service.fincaraiz.com.co/api/v1")
+SEARCH_URL = f"{API_URL}/properties/search"
+LOCATION_URL = f"{API_URL}/locations/infofinca-autocomplete"
 
-def get_location(query:str)->dict:
-    url = "https://search-service.fincaraiz.com.co/api/v1/locations/infofinca-autocomplete"
+REQUEST_TIMEOUT = float(os.getenv("FINCA_RAIZ_TIMEOUT", "30"))
+RATE_LIMIT = float(os.getenv("FINCA_RAIZ_RATE_LIMIT", "10"))  # requests per second
+MAX_CONCURRENCY = int(os.getenv("FINCA_RAIZ_CONCURRENCY", "8"))
+MAX_RETRIES = int(os.getenv("FINCA_RAIZ_MAX_RETRIES", "5"))
 
-    payload = {
+# Sort codes of the search API. The newest-first code can be overridden if the API changes it
+ORDER_DEFAULT = 2
+ORDER_NEWEST_FIRST = int(os.getenv("FINCA_RAIZ_ORDER_NEWEST", "3"))
+
+HEADERS = {
+    "accept": "*/*",
+    "accept-language": "en-US,en;q=0.9",
+    "content-type": "application/json",
+    "origin": "https://www.fincaraiz.com.co",
+    "priority": "u=1, i",
+    "referer": "https://www.fincaraiz.com.co/",
+    "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36",
+    "x-origin": "www.fincaraiz.com.co"
+}
+
+# Shared by the synchronous helpers so consecutive calls reuse the same connection
+_session = requests.Session()
+_session.headers.update(HEADERS)
+
+
+def build_location_payload(query: str) -> dict:
+    return {
         "operationName": "Location",
         "variables": {"strSearch": query},
         "query": ""
     }
-    headers = {
-        "accept": "*/*",
-        "accept-language": "en-US,en;q=0.9",
-        "content-type": "application/json",
-        "origin": "https://www.fincaraiz.com.co",
-        "priority": "u=1, i",
-        "referer": "https://www.fincaraiz.com.co/venta/casas-y-apartamentos/bogota/bogota-dc",
-        "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36",
-        "x-origin": "www.fincaraiz.com.co"
-    }
 
-    response = requests.request("POST", url, json=payload, headers=headers).json()
-    
+def parse_location(response: dict) -> dict:
     return {
         'type': response['data']['searchLocation'][0]['type'],
         'name': response['data']['searchLocation'][0]['name'],
@@ -73,22 +96,20 @@ def get_location(query:str)->dict:
 
     }
 
-def get_total_hits(property_type_id, operation_type_id, projects=None, location=None)->dict:
-    url =  "https://search-service.fincaraiz.com.co/api/v1/properties/search"
-
+def build_search_payload(rows, page, property_type_id, operation_type_id, projects=None, location=None, order=ORDER_DEFAULT) -> dict:
     payload = {
         "variables": {
-            "rows": 1,
+            "rows": rows,
             "params": {
-                "page": 1,
-                "order": 2,
+                "page": page,
+                "order": order,
                 "operation_type_id": operation_type_id,
                 "property_type_id": [property_type_id],
                 "currencyID": 4,
                 "m2Currency": 4,
                 "locations": [location]
             },
-            "page": 1,
+            "page": page,
             "source": 10
         },
         "query": ""
@@ -99,23 +120,97 @@ def get_total_hits(property_type_id, operation_type_id, projects=None, location=
 
     if location is not None:
         payload["variables"]["params"]["locations"] = [location]
-    
-    headers = {
-        "accept": "*/*",
-        "accept-language": "en-US,en;q=0.9",
-        "content-type": "application/json",
-        "origin": "https://www.fincaraiz.com.co",
-        "priority": "u=1, i",
-        "referer": "https://www.fincaraiz.com.co/",
-        "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36",
-        "x-origin": "www.fincaraiz.com.co"
-    }
 
+    return payload
 
-    response = requests.request("POST", url, json=payload, headers=headers).json()
-    
+def parse_total_hits(response: dict) -> int:
     return response.get('hits',{'message':'No hay hits'}).get('total',{'message':'No hay total'}).get('value', -1)
 
+# Column name, typed Arrow column and how it is read from a search listing
+_CATEGORY = pa.dictionary(pa.int8(), pa.string())
+_LISTING_FIELDS = [
+    ('SOURCE', _CATEGORY, lambda p: 'Finca Raiz'),
+    ('WEB_PROPERTY_CODE', pa.int64(), lambda p: p['id']),
+    ('PRICE', pa.float64(), lambda p: p['price']['amount']),
+    ('PRICE_ADMIN_INCLUDED', pa.bool_(), lambda p: p['price']['admin_included']),
+    ('AREA', pa.float64(), lambda p: p['m2']),
+    ('LATITUDE', pa.float64(), lambda p: p['latitude']),
+    ('LONGITUDE', pa.float64(), lambda p: p['longitude']),
+    ('ANTIQUITY', _CATEGORY, lambda p: INDEX_ANTIQUITY.get(p['antiquity'], None)),
+    ('CONSTRUCTION_YEAR', pa.int16(), lambda p: p['construction_year']),
+    ('BUILT_AREA', pa.float64(), lambda p: p['m2Built']),
+    ('PRIVATE_AREA', pa.float64(), lambda p: p['m2apto']),
+    ('GARAGE', pa.int16(), lambda p: p['garage']),
+    ('BATHROOMS', pa.int16(), lambda p: p['bathrooms']),
+    ('ROOMS', pa.int16(), lambda p: p['rooms']),
+    ('FLOOR', pa.int16(), lambda p: p['floor']),
+    ('PROPERTY_TYPE', _CATEGORY, lambda p: INDEX_PROPERTY.get(p['property_type_id'], None)),
+    ('OPERATION_TYPE', _CATEGORY, lambda p: INDEX_OPERATION.get(p['operation_type_id'], None)),
+    ('STRATUM', pa.int8(), lambda p: p['stratum']),
+    ('BEDROOMS', pa.int16(), lambda p: p['bedrooms']),
+    ('DESCRIPTION', pa.string(), lambda p: p['description']),
+    ('LINK', pa.string(), lambda p: 'https://www.fincaraiz.com.co' + p['link']),
+]
+LISTING_SCHEMA = pa.schema([(name, type) for name, type, _ in _LISTING_FIELDS])
+
+
+def _coerce(value, type: pa.DataType):
+    # Same spirit as pd.to_numeric(errors='coerce'): anything unparseable becomes null
+    if value is None:
+        return None
+    if pa.types.is_integer(type) or pa.types.is_floating(type):
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return None
+        if not pa.types.is_integer(type):
+            return number
+        bounds = np.iinfo(type.to_pandas_dtype())
+        return int(number) if math.isfinite(number) and bounds.min <= number <= bounds.max else None
+    if pa.types.is_boolean(type):
+        return bool(value)
+    return str(value)
+
+
+def to_array(values: list, type: pa.DataType) -> pa.Array:
+    try:
+        return pa.array(values, type=type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([_coerce(value, type) for value in values], type=type)
+
+
+def parse_hits_batch(response: dict) -> pa.RecordBatch:
+    """
+    Search hits as one typed record batch with `LISTING_SCHEMA`, built column by column.
+    Listings whose id isn't numeric are dropped: with a null code they would all share one `_id`.
+    """
+    listings = [hit['_source']['listing'] for hit in response['hits']['hits']]
+    columns = [to_array([get(listing) for listing in listings], type) for _, type, get in _LISTING_FIELDS]
+    batch = pa.RecordBatch.from_arrays(columns, schema=LISTING_SCHEMA)
+    keyed = pc.is_valid(batch.column('WEB_PROPERTY_CODE'))
+    if keyed.false_count:
+        dropped = [listing.get('id') for listing, valid in zip(listings, keyed.to_pylist()) if not valid]
+        print(f"⚠️ Dropped {len(dropped)} listings without a numeric id: {dropped[:5]}")
+        batch = batch.filter(keyed)
+    return batch
+
+
+def parse_hits(response: dict) -> list[dict]:
+    return [
+        {name: get(hit['_source']['listing']) for name, _, get in _LISTING_FIELDS}
+        for hit in response['hits']['hits']
+    ]
+
+
+def get_location(query:str)->dict:
+    response = _session.post(LOCATION_URL, json=build_location_payload(query), timeout=REQUEST_TIMEOUT).json()
+    return parse_location(response)
+
+def get_total_hits(property_type_id, operation_type_id, projects=None, location=None)->dict:
+    payload = build_search_payload(1, 1, property_type_id, operation_type_id, projects, location)
+    response = _session.post(SEARCH_URL, json=payload, timeout=REQUEST_TIMEOUT).json()
+    return parse_total_hits(response)
+
 def get_total_pages(total_hits:int, rows:int) -> int:
         pages = total_hits // rows
         if total_hits % rows > 0:
@@ -124,79 +219,101 @@ def get_total_pages(total_hits:int, rows:int) -> int:
 
     
 def get_hits(rows, pages, property_type_id, operation_type_id, projects=None, location=None)->list[dict]:
+    payload = build_search_payload(rows, pages, property_type_id, operation_type_id, projects, location)
+    response = _session.post(SEARCH_URL, json=payload, timeout=REQUEST_TIMEOUT).json()
+    return parse_hits(response)
 
-    url =  "https://search-service.fincaraiz.com.co/api/v1/properties/search"
 
-    payload = {
-        "variables": {
-            "rows": rows,
-            "params": {
-                "page": pages,
-                "order": 2,
-                "operation_type_id": operation_type_id,
-                "property_type_id": [property_type_id],
-                "currencyID": 4,
-                "m2Currency": 4,
-                "locations": [location]
-            },
-            "page": pages,
-            "source": 10
-        },
-        "query": ""
-    }
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second with bursts of up to `capacity`."""
 
-    if projects is not None:
-        payload["variables"]["params"]["projects"] = projects
+    def __init__(self, rate: float, capacity: int | None = None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
 
-    if location is not None:
-        payload["variables"]["params"]["locations"] = [location]
-    
-    headers = {
-        "accept": "*/*",
-        "accept-language": "en-US,en;q=0.9",
-        "content-type": "application/json",
-        "origin": "https://www.fincaraiz.com.co",
-        "priority": "u=1, i",
-        "referer": "https://www.fincaraiz.com.co/",
-        "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36",
-        "x-origin": "www.fincaraiz.com.co"
-    }
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _is_retryable(error: BaseException) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+class FincaRaizClient:
+    """
+    Asyncio client for the Finca Raíz search API.
+
+    All requests share one pooled keep-alive connection set, go through a token-bucket
+    rate limit, are bounded to `max_concurrency` in flight and are retried with
+    exponential backoff on transport errors, 429 and 5xx responses.
+    """
+
+    def __init__(self, rate_limit: float = RATE_LIMIT, max_concurrency: int = MAX_CONCURRENCY,
+                 max_retries: int = MAX_RETRIES, timeout: float = REQUEST_TIMEOUT, api_url: str | None = None, transport=None):
+        api_url = api_url or os.getenv("FINCA_RAIZ_API_URL", API_URL)
+        self.max_retries = max_retries
+        self.search_url = f"{api_url}/properties/search"
+        self.location_url = f"{api_url}/locations/infofinca-autocomplete"
+        self._bucket = TokenBucket(rate_limit)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._locations: dict[str, dict] = {}
+        self._client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            transport=transport,
+        )
+
+    async def __aenter__(self) -> 'FincaRaizClient':
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def post(self, url: str, payload: dict) -> dict:
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(self.max_retries),
+            wait=wait_exponential_jitter(initial=0.5, max=30),
+            retry=retry_if_exception(_is_retryable),
+            reraise=True,
+        ):
+            with attempt:
+                async with self._semaphore:
+                    await self._bucket.acquire()
+                    response = await self._client.post(url, json=payload)
+                    response.raise_for_status()
+                    return response.json()
+
+    async def get_location(self, query: str) -> dict:
+        # Locations never change during a run, resolve each one once per client
+        if query not in self._locations:
+            self._locations[query] = parse_location(await self.post(self.location_url, build_location_payload(query)))
+        return self._locations[query]
+
+    async def get_total_hits(self, property_type_id, operation_type_id, projects=None, location=None) -> int:
+        payload = build_search_payload(1, 1, property_type_id, operation_type_id, projects, location)
+        return parse_total_hits(await self.post(self.search_url, payload))
+
+    async def search(self, rows, page, property_type_id, operation_type_id, projects=None, location=None, order=ORDER_DEFAULT) -> dict:
+        """Raw search response, for callers that archive it before parsing."""
+        payload = build_search_payload(rows, page, property_type_id, operation_type_id, projects, location, order)
+        return await self.post(self.search_url, payload)
 
-    response = requests.request("POST", url, json=payload, headers=headers).json()
-
-    response_list = response['hits']['hits']
-
-    items = []
-    for hit in response_list:
-
-        property = hit['_source']['listing']
-
-        item = {
-            'SOURCE': 'Finca Raiz',
-            'WEB_PROPERTY_CODE': property['id'],
-            'PRICE': property['price']['amount'],
-            'PRICE_ADMIN_INCLUDED': property['price']['admin_included'],
-            'AREA': property['m2'],
-            'LATITUDE': property['latitude'],
-            'LONGITUDE': property['longitude'],
-            'ANTIQUITY': INDEX_ANTIQUITY.get(property['antiquity'], None),
-            'CONSTRUCTION_YEAR': property['construction_year'],
-            'BUILT_AREA': property['m2Built'],
-            'PRIVATE_AREA': property['m2apto'],
-            'GARAGE': property['garage'],
-            'BATHROOMS': property['bathrooms'],
-            'ROOMS': property['rooms'],
-            'FLOOR': property['floor'],
-            'PROPERTY_TYPE': INDEX_PROPERTY.get(property['property_type_id'],None),
-            'OPERATION_TYPE': INDEX_OPERATION.get(property['operation_type_id'],None),
-            'STRATUM': property['stratum'],
-            'BEDROOMS': property['bedrooms'],
-            'DESCRIPTION': property['description'],
-            'LINK': 'https://www.fincaraiz.com.co'+property['link'],
-            # 'FUNCIONA': True # Si el coso esta en funca raiz, pues en teoria está funcionando
-        }
-
-        items.append(item)
-
-    return items
-   
+    async def get_hits(self, rows, page, property_type_id, operation_type_id, projects=None, location=None, order=ORDER_DEFAULT) -> list[dict]:
+        return parse_hits(await self.search(rows, page, property_type_id, operation_type_id, projects, location, order))
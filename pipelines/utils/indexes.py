@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, DESCENDING
+
+from . import rules as rl
+from .capping import CAP_FIELDS, cap_update, window_filter
+from .crawler import KNOWN_CODES_INDEX, KNOWN_CODES_PROJECTION
+from .dedup import ensure_unique_index, losing_ids_pipeline
+
+LISTING_COLLECTIONS = ["Arriendo", "Venta"]
+
+# Names are left to MongoDB's default (`<field>_<dir>_...`) so they match the indexes the
+# pipelines already create on the fly, and re-running is a no-op instead of a name conflict.
+LISTING_INDEXES = [
+    # recommend_properties filters and the fallback find
+    [("PROPERTY_TYPE", ASCENDING), ("PRICE", ASCENDING), ("AREA", ASCENDING)],
+    # One per field the cleaning $or filters touch, so each branch of the $or has an index
+    *[[(field, ASCENDING)] for field in CAP_FIELDS],
+    [("FLOOR", ASCENDING)],
+    [("STRATUM", ASCENDING)],
+    # Cleaning watermark window, the listings first seen in it (sketched) and latest_batch_id
+    [("scraped_at", ASCENDING)],
+    [("first_seen_at", ASCENDING)],
+    [("batch_id", DESCENDING)],
+    # load_known_codes of incremental scrapes, an index-only scan
+    KNOWN_CODES_INDEX,
+]
+
+
+def ensure_indexes(db, collections: list[str] = LISTING_COLLECTIONS) -> dict[str, list[str]]:
+    """Create every declared index (creating an existing one is a no-op), returns the names per collection."""
+    created = {}
+    for name in collections:
+        collection = db[name]
+        created[name] = [collection.create_index(keys) for keys in LISTING_INDEXES]
+        # Partial unique (SOURCE, WEB_PROPERTY_CODE); fails while duplicates remain, see remove_duplicates
+        ensure_unique_index(collection)
+    return created
+
+
+def query_shapes(now: datetime | None = None) -> list[dict]:
+    """The filters, sorts and pipelines the backend and the pipelines actually send, with representative values."""
+    now = now or datetime.now()
+    window = window_filter(now - timedelta(days=1), now)
+    cleaning_rules = rl.load_rules()
+    cap_query, _ = cap_update({"Apartamento": {field: 1 for field in CAP_FIELDS}}, CAP_FIELDS)
+    return [
+        {"name": "recommend", "filter": {"PROPERTY_TYPE": "Apartamento", "PRICE": {"$gte": 1_000_000, "$lte": 5_000_000}, "AREA": {"$gte": 50}}},
+        {"name": "recommend_price_only", "filter": {"PRICE": {"$gte": 1_000_000, "$lte": 5_000_000}}},
+        {"name": "recommend_area_only", "filter": {"AREA": {"$gte": 50}}},
+        {"name": "erroneous_values", "filter": rl.compile_filter(cleaning_rules)},
+        {"name": "erroneous_values_window", "filter": {"$and": [window, rl.compile_filter(cleaning_rules)]}},
+        {"name": "cap_outliers", "filter": cap_query},
+        {"name": "cap_outliers_window", "filter": {"$and": [window, cap_query]}},
+        {"name": "cap_sketch_window", "filter": window_filter(now - timedelta(days=1), now, field="first_seen_at")},
+        {"name": "cleaning_watermark", "filter": {"scraped_at": {"$type": "date"}}, "sort": [("scraped_at", DESCENDING)]},
+        {"name": "latest_batch_id", "filter": {}, "sort": [("batch_id", DESCENDING)]},
+        {"name": "known_codes", "filter": {}, "projection": KNOWN_CODES_PROJECTION, "hint": KNOWN_CODES_INDEX},
+        {"name": "dedup", "pipeline": losing_ids_pipeline()},
+    ]
+
+
+def plan_stages(explain: dict) -> list[str]:
+    """Every stage of every winning plan in an explain output, for find and aggregate alike."""
+    stages = []
+
+    def walk(node, in_plan: bool):
+        if isinstance(node, dict):
+            if in_plan and isinstance(node.get("stage"), str):
+                stages.append(node["stage"])
+            for key, value in node.items():
+                walk(value, in_plan or key == "winningPlan")
+        elif isinstance(node, list):
+            for value in node:
+                walk(value, in_plan)
+
+    walk(explain, False)
+    return stages
+
+
+def explain_shape(collection, shape: dict) -> dict:
+    if "pipeline" in shape:
+        explain = collection.database.command("aggregate", collection.name, pipeline=shape["pipeline"], explain=True)
+    else:
+        cursor = collection.find(shape["filter"], shape.get("projection"))
+        if shape.get("hint"):
+            cursor = cursor.hint(shape["hint"])
+        if shape.get("sort"):
+            cursor = cursor.sort(shape["sort"]).limit(1)
+        explain = cursor.explain()
+    stages = plan_stages(explain)
+    return {"collection": collection.name, "name": shape["name"], "stages": stages, "collscan": "COLLSCAN" in stages}
+
+
+def audit_indexes(db, collections: list[str] = LISTING_COLLECTIONS) -> list[dict]:
+    """`explain` every query shape on every collection, `collscan` flags the ones without an index."""
+    return [explain_shape(db[name], shape) for name in collections for shape in query_shapes()]
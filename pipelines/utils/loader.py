@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import uuid
+from typing import Iterator
+
+import pyarrow as pa
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from . import rules as rl
+from .archive import _filesystem, _partition_value
+from .finca_raiz import LISTING_SCHEMA, to_array
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.json")
+# Local path or any URI pyarrow understands, local snapshots are memory-mapped
+SNAPSHOT_URI = os.getenv("TRAINING_SNAPSHOT_URI", "data/snapshots")
+CURSOR_BATCH_SIZE = 10_000
+
+# Areas don't need double precision, prices and coordinates do
+_COMPACT_TYPES = {"AREA": pa.float32(), "BUILT_AREA": pa.float32(), "PRIVATE_AREA": pa.float32()}
+
+
+def training_fields(config_path: str = CONFIG_PATH) -> list[str]:
+    """Target, features and the fields the cleaning rules filter on, in config.json order."""
+    with open(config_path, "r") as f:
+        config = json.load(f)
+    fields = config["y_column"] + config["numeric_features"] + config["categorical_features"]
+    fields += [rule["field"] for rule in rl.load_rules(config_path)] + ["PROPERTY_TYPE"]
+    return list(dict.fromkeys(fields))
+
+
+def snapshot_schema(fields: list[str]) -> pa.Schema:
+    """Listing types from the scraper's schema (int8/int16, dictionary categories), float64 for anything else."""
+    types = {field.name: field.type for field in LISTING_SCHEMA}
+    return pa.schema([(name, _COMPACT_TYPES.get(name, types.get(name, pa.float64()))) for name in fields])
+
+
+def latest_batch_id(collection) -> str | None:
+    doc = collection.find_one({"batch_id": {"$exists": True}}, {"batch_id": 1}, sort=[("batch_id", -1)])
+    return doc["batch_id"] if doc else None
+
+
+def stream_batches(collection, schema: pa.Schema, batch_size: int = CURSOR_BATCH_SIZE) -> Iterator[pa.RecordBatch]:
+    """The collection as typed record batches, projecting only the schema's fields and holding one batch at a time."""
+    cursor = collection.find({}, {"_id": 0, **{name: 1 for name in schema.names}}, batch_size=batch_size)
+    docs = []
+    for doc in cursor:
+        docs.append(doc)
+        if len(docs) >= batch_size:
+            yield _to_batch(docs, schema)
+            docs = []
+    if docs:
+        yield _to_batch(docs, schema)
+
+
+def _to_batch(docs: list[dict], schema: pa.Schema) -> pa.RecordBatch:
+    columns = [to_array([doc.get(field.name) for doc in docs], field.type) for field in schema]
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def snapshot_path(root: str, collection_name: str, batch_id: str, fields: list[str]) -> str:
+    # The feature set is part of the key, so a config.json change never reads a stale snapshot
+    fields_key = hashlib.sha1(",".join(fields).encode()).hexdigest()[:12]
+    return f"{root}/{_partition_value(collection_name)}/batch_id={_partition_value(batch_id)}/fields-{fields_key}.parquet"
+
+
+def load_snapshot(collection, fields: list[str] | None = None, uri: str = SNAPSHOT_URI,
+                  batch_size: int = CURSOR_BATCH_SIZE, refresh: bool = False) -> tuple[pa.Table, dict]:
+    """
+    One collection's training columns, cached as a Parquet snapshot keyed by its latest `batch_id`.
+    A cached snapshot is read (memory-mapped when local) instead of querying MongoDB again; otherwise
+    the cursor is streamed batch by batch into the Parquet file, which is then read back.
+    """
+    fields = fields or training_fields()
+    schema = snapshot_schema(fields)
+    batch_id = latest_batch_id(collection)
+    if batch_id is None:
+        # Nothing to key the cache on (e.g. listings written before batch ids existed)
+        return pa.Table.from_batches(list(stream_batches(collection, schema, batch_size)), schema=schema), {"batch_id": None, "cached": False}
+
+    fs, root = _filesystem(uri)
+    path = snapshot_path(root, collection.name, batch_id, fields)
+    cached = not refresh and fs.get_file_info(path).type == pafs.FileType.File
+    if not cached:
+        fs.create_dir(path.rsplit("/", 1)[0], recursive=True)
+        # Written next to the final path and moved, so an interrupted load never leaves a partial snapshot
+        partial = f"{path}.{uuid.uuid4().hex[:8]}.partial"
+        with fs.open_output_stream(partial) as sink, pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+            for batch in stream_batches(collection, schema, batch_size):
+                writer.write_batch(batch)
+        fs.move(partial, path)
+
+    if isinstance(fs, pafs.LocalFileSystem):
+        table = pq.read_table(path, memory_map=True)
+    else:
+        table = pq.read_table(path, filesystem=fs)
+    return table, {"batch_id": batch_id, "cached": cached, "path": path}
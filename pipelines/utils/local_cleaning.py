@@ -0,0 +1,146 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pymongo import UpdateOne
+
+from . import rules as rl
+from .capping import CAP_FIELDS, CAP_PERCENTILE
+from .dedup import DEDUP_KEY, DELETE_CHUNK_SIZE
+
+DELETES_FILE = "deletes.parquet"
+UPDATES_FILE = "updates.parquet"
+
+
+def duplicate_mask(table: pa.Table) -> pa.ChunkedArray:
+    """
+    True for the rows that lose their (SOURCE, WEB_PROPERTY_CODE) group, keeping the most
+    recently scraped one as `losing_ids_pipeline` does. Rows missing the key are never duplicates.
+    """
+    rows = pa.array(np.arange(table.num_rows))
+    keyed = pc.and_(*[pc.is_valid(table.column(field)) for field in DEDUP_KEY])
+    order = [name for name in ["scraped_at", "_id"] if name in table.column_names]
+    candidates = table.select(DEDUP_KEY + order).append_column("__row", rows).filter(keyed)
+    # Sorted newest first (missing scraped_at last, like $top), the first row of each group wins
+    candidates = candidates.sort_by([(name, "descending") for name in order])
+    winners = candidates.group_by(DEDUP_KEY, use_threads=False).aggregate([("__row", "first")]).column("__row_first")
+    return pc.and_(keyed, pc.invert(pc.is_in(rows, value_set=winners)))
+
+
+def erroneous_mask(table: pa.Table, rules: list[dict]) -> pa.ChunkedArray:
+    """True for the rows any cleaning rule matches, the same rows `compile_filter` deletes in Mongo."""
+    expression = rl.compile_expression(rules, table.column_names)
+    matches = ds.dataset(table).to_table(columns={"matches": expression}).column("matches")
+    return pc.fill_null(matches, False)
+
+
+def _cap_partition(table: pa.Table, fields: list[str], percentile: float, with_caps: bool) -> tuple[dict, pa.Table]:
+    """p-th percentile caps of one property type and its capped columns (negatives become 0)."""
+    caps = {}
+    for field in fields:
+        original = table.column(field).cast(pa.float64())
+        capped = pc.max_element_wise(original, 0.0, skip_nulls=False)
+        if with_caps and pc.count(original).as_py():
+            caps[field] = pc.quantile(original, q=percentile)[0].as_py()
+            capped = pc.min_element_wise(capped, caps[field], skip_nulls=False)
+        table = table.set_column(table.column_names.index(field), field, capped)
+    return caps, table
+
+
+def cap_outliers(table: pa.Table, fields: list[str] = CAP_FIELDS, percentile: float = CAP_PERCENTILE,
+                 threads: int | None = None) -> tuple[dict[str, dict[str, float]], pa.Table]:
+    """
+    Exact per property type percentile caps, one property type per thread (Arrow kernels release
+    the GIL). Rows without a property type only get their negatives set to 0, as in `cap_update`.
+    The result is grouped by property type, so the row order changes.
+    """
+    fields = [field for field in fields if field in table.column_names]
+    types = [value for value in pc.unique(table.column("PROPERTY_TYPE")).to_pylist() if value is not None]
+    partitions = [(ptype, table.filter(pc.equal(table.column("PROPERTY_TYPE"), ptype))) for ptype in types]
+    partitions.append((None, table.filter(pc.is_null(table.column("PROPERTY_TYPE")))))
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(lambda item: _cap_partition(item[1], fields, percentile, item[0] is not None), partitions))
+
+    caps = {ptype: type_caps for (ptype, _), (type_caps, _) in zip(partitions, results) if type_caps}
+    return caps, pa.concat_tables([capped for _, capped in results])
+
+
+def changed_values(original: pa.Table, capped: pa.Table, fields: list[str]) -> pa.Table:
+    """`_id` plus the capped value of every field that changed (null where it didn't), one row per changed document."""
+    capped = capped.select(["_id"] + fields)
+    before = original.select(["_id"] + fields).join(capped, "_id", right_suffix="__capped")
+    columns, changed = {"_id": before.column("_id")}, None
+    for field in fields:
+        differs = pc.fill_null(pc.not_equal(before.column(field).cast(pa.float64()), before.column(f"{field}__capped")), False)
+        columns[field] = pc.if_else(differs, before.column(f"{field}__capped"), None)
+        changed = differs if changed is None else pc.or_(changed, differs)
+    updates = pa.table(columns)
+    return updates.filter(changed) if changed is not None else updates.slice(0, 0)
+
+
+def clean_table(table: pa.Table, rules: list[dict] | None = None, fields: list[str] = CAP_FIELDS,
+                percentile: float = CAP_PERCENTILE, threads: int | None = None) -> dict:
+    """
+    The cleaning pipeline (dedup, erroneous values, capping) applied to an Arrow table.
+    Returns the cleaned table, the caps and the diff (deleted ids with a reason, capped values).
+    """
+    rules = rl.load_rules() if rules is None else rules
+    has_ids = "_id" in table.column_names
+
+    duplicates = duplicate_mask(table)
+    erroneous = pc.and_(pc.invert(duplicates), erroneous_mask(table, rules))
+    deleted = pc.or_(duplicates, erroneous)
+    kept = table.filter(pc.invert(deleted))
+
+    caps, cleaned = cap_outliers(kept, fields, percentile, threads)
+    fields = [field for field in fields if field in kept.column_names]
+
+    deletes = updates = None
+    if has_ids:
+        deletes = pa.table({
+            "_id": table.column("_id").filter(deleted),
+            "reason": pc.if_else(duplicates.filter(deleted), "duplicate", "erroneous"),
+        })
+        updates = changed_values(kept, cleaned, fields)
+
+    return {"table": cleaned, "caps": caps, "deletes": deletes, "updates": updates,
+            "stats": {"rows": table.num_rows, "duplicates": pc.sum(duplicates).as_py() or 0,
+                      "erroneous": pc.sum(erroneous).as_py() or 0, "capped": updates.num_rows if updates is not None else None}}
+
+
+def clean_snapshot(source: str, destination: str, diff_dir: str | None = None, threads: int | None = None, **kwargs) -> dict:
+    """Clean a Parquet snapshot into `destination`, optionally writing the diff that `apply_diff` replays on Mongo."""
+    result = clean_table(pq.read_table(source, memory_map=True), threads=threads, **kwargs)
+    pq.write_table(result["table"], destination)
+    if diff_dir:
+        if result["deletes"] is None:
+            raise ValueError("The snapshot has no _id column, a diff can't be applied back to MongoDB")
+        os.makedirs(diff_dir, exist_ok=True)
+        pq.write_table(result["deletes"], os.path.join(diff_dir, DELETES_FILE))
+        pq.write_table(result["updates"], os.path.join(diff_dir, UPDATES_FILE))
+    return {"caps": result["caps"], **result["stats"]}
+
+
+def apply_diff(collection, diff_dir: str, chunk_size: int = DELETE_CHUNK_SIZE) -> dict:
+    """Bulk-apply a cleaning diff to a Mongo collection: chunked `delete_many`s, then one `$set` per capped document."""
+    deletes = pq.read_table(os.path.join(diff_dir, DELETES_FILE), columns=["_id"]).column("_id").to_pylist()
+    deleted = sum(
+        collection.delete_many({"_id": {"$in": deletes[start:start + chunk_size]}}).deleted_count
+        for start in range(0, len(deletes), chunk_size)
+    )
+
+    modified = 0
+    updates = pq.read_table(os.path.join(diff_dir, UPDATES_FILE))
+    for batch in updates.to_batches(max_chunksize=chunk_size):
+        requests = [
+            UpdateOne({"_id": row["_id"]}, {"$set": {field: value for field, value in row.items() if field != "_id" and value is not None}})
+            for row in batch.to_pylist()
+        ]
+        if requests:
+            modified += collection.bulk_write(requests, ordered=False).modified_count
+    return {"deleted": deleted, "modified": modified}
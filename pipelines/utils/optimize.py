@@ -1,40 +1,162 @@
-from sklearn.model_selection import cross_val_score
+from sklearn.model_selection import KFold, train_test_split
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.linear_model import ElasticNet
-from sklearn.metrics import make_scorer
 
 from .evaluate import median_absolute_percentage_error
 
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from functools import partial
+import multiprocessing
+import os
+import tempfile
+import threading
+import numpy as np
 import optuna
+from optuna.storages import JournalStorage
+from optuna.storages.journal import JournalFileBackend
+from threadpoolctl import threadpool_limits
 
-from lightgbm import LGBMRegressor
-from xgboost import XGBRegressor
+import lightgbm as lgb
+import xgboost as xgb
 
 # Suppress Optuna's info messages
 optuna.logging.set_verbosity(optuna.logging.WARNING)
 
-# Objective functions 
-def objective_random_forest(trial, X = None, y = None):
+N_FOLDS = 5
+# Boosters get their upper bound of trees and stop once this many rounds don't improve
+# the early-stopping split, carved out of each training fold so the scored fold stays unseen
+EARLY_STOPPING_ROUNDS = 50
+EARLY_STOPPING_FRACTION = 0.1
+XGBOOST_MAX_ROUNDS = 1000
+LIGHTGBM_MAX_ROUNDS = 800
+
+SAMPLERS = {
+    "random": lambda seed: optuna.samplers.RandomSampler(seed=seed),
+    "tpe": lambda seed: optuna.samplers.TPESampler(seed=seed, multivariate=True),
+    # Needs the `cmaes` package
+    "cmaes": lambda seed: optuna.samplers.CmaEsSampler(seed=seed, warn_independent_sampling=False),
+}
+PRUNERS = {
+    "none": lambda: optuna.pruners.NopPruner(),
+    "median": lambda: optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=1),
+    "hyperband": lambda: optuna.pruners.HyperbandPruner(min_resource=1, max_resource=N_FOLDS, reduction_factor=3),
+}
+
+# Cores each concurrent trial gets by default: boosters scale well up to a few threads per
+# model, past that more concurrent trials finish more work per hour
+THREADS_PER_TRIAL = 4
+
+
+@dataclass
+class Fold:
+    """Row indices of one fold. Arrays are sliced on demand, only the native datasets are kept."""
+    X: np.ndarray
+    y: np.ndarray
+    fit_index: np.ndarray
+    stop_index: np.ndarray
+    valid_index: np.ndarray
+
+    @property
+    def train_index(self) -> np.ndarray:
+        return np.sort(np.concatenate([self.fit_index, self.stop_index]))
+
+    @property
+    def X_train(self) -> np.ndarray:
+        return self.X[self.train_index]
+
+    @property
+    def y_train(self) -> np.ndarray:
+        return self.y[self.train_index]
+
+    @property
+    def X_valid(self) -> np.ndarray:
+        return self.X[self.valid_index]
+
+    @property
+    def y_valid(self) -> np.ndarray:
+        return self.y[self.valid_index]
+
+
+class CVFolds:
+    """
+    The CV folds of a search, split once (with each fold's early-stopping split) and shared by
+    every trial. The boosters' native datasets (XGBoost QuantileDMatrix, LightGBM Dataset) hold
+    the binned features and are built on first use, then reused, so trials skip re-binning.
+    They are cached per thread: concurrent trials never train on the same dataset object.
+    """
+
+    def __init__(self, X, y, n_folds=N_FOLDS):
+        X, y = np.asarray(X), np.asarray(y).ravel()
+        self.folds = []
+        for train_index, valid_index in KFold(n_splits=n_folds).split(X):
+            fit_index, stop_index = train_test_split(train_index, test_size=EARLY_STOPPING_FRACTION, random_state=42)
+            self.folds.append(Fold(X, y, fit_index, stop_index, valid_index))
+        self._local = threading.local()
+
+    def xgboost(self) -> list[tuple]:
+        """(fit, stop, valid) QuantileDMatrix per fold, the stop and valid ones binned with the fit one's cuts."""
+        if not hasattr(self._local, "xgboost"):
+            self._local.xgboost = []
+            for fold in self.folds:
+                fit = xgb.QuantileDMatrix(fold.X[fold.fit_index], fold.y[fold.fit_index])
+                stop = xgb.QuantileDMatrix(fold.X[fold.stop_index], fold.y[fold.stop_index], ref=fit)
+                self._local.xgboost.append((fit, stop, xgb.QuantileDMatrix(fold.X_valid, ref=fit)))
+        return self._local.xgboost
+
+    def lightgbm(self) -> list[tuple]:
+        """(fit, stop) Dataset per fold. No feature pre-filtering, so trials may change min_child_samples."""
+        if not hasattr(self._local, "lightgbm"):
+            self._local.lightgbm = []
+            for fold in self.folds:
+                fit = lgb.Dataset(fold.X[fold.fit_index], fold.y[fold.fit_index], params={"feature_pre_filter": False, "verbose": -1}).construct()
+                self._local.lightgbm.append((fit, lgb.Dataset(fold.X[fold.stop_index], fold.y[fold.stop_index], reference=fit).construct()))
+        return self._local.lightgbm
+
+
+def cross_validate(trial, fit_fold, folds):
+    """
+    Mean MDAPE over the folds, reported after every fold so the pruner can stop a trial that is
+    already worse than its peers. `fit_fold(index, fold)` returns the predictions and, for
+    boosters, the early-stopped number of trees, kept as the trial's `n_estimators`.
+    """
+    scores, iterations = [], []
+    for index, fold in enumerate(folds.folds):
+        y_pred, best_iteration = fit_fold(index, fold)
+        scores.append(median_absolute_percentage_error(fold.y_valid, y_pred))
+        if best_iteration is not None:
+            iterations.append(best_iteration)
+
+        trial.report(float(np.mean(scores)), index)
+        if trial.should_prune():
+            raise optuna.TrialPruned()
+
+    if iterations:
+        trial.set_user_attr("n_estimators", int(np.mean(iterations)))
+    return float(np.mean(scores))
+
+
+# Objective functions
+def objective_random_forest(trial, folds = None, n_threads = -1):
 
     n_estimators = trial.suggest_int('n_estimators', 100, 1000)
     max_depth = trial.suggest_int('max_depth', 10, 50)
     min_samples_split = trial.suggest_int('min_samples_split', 2, 32)
     min_samples_leaf = trial.suggest_int('min_samples_leaf', 1, 32)
 
-    model = RandomForestRegressor(n_estimators=n_estimators,
-    max_depth=max_depth,
-    min_samples_split=min_samples_split,
-    min_samples_leaf=min_samples_leaf)
+    def fit_fold(index, fold):
+        model = RandomForestRegressor(n_estimators=n_estimators,
+        max_depth=max_depth,
+        min_samples_split=min_samples_split,
+        min_samples_leaf=min_samples_leaf,
+        n_jobs=n_threads)
+        return model.fit(fold.X_train, fold.y_train).predict(fold.X_valid), None
 
-    score = cross_val_score(model, X, y, n_jobs=-1, cv=5, scoring=make_scorer(median_absolute_percentage_error)).mean()
+    return cross_validate(trial, fit_fold, folds)
 
-    return score
+def objective_xgboost(trial, folds = None, n_threads = -1):
 
-def objective_xgboost(trial, X = None, y = None):
-     
     params = {
-        'n_estimators': trial.suggest_int('n_estimators', 100, 1000),
         'max_depth': trial.suggest_int('max_depth', 3, 12),
         'learning_rate': trial.suggest_float('learning_rate', 0.01, 0.3, log=True),
         'subsample': trial.suggest_float('subsample', 0.6, 1.0),
@@ -43,21 +165,23 @@ def objective_xgboost(trial, X = None, y = None):
         'min_child_weight': trial.suggest_int('min_child_weight', 1, 10),
         'reg_alpha': trial.suggest_float('reg_alpha', 0, 1),
         'reg_lambda': trial.suggest_float('reg_lambda', 0, 1),
-        'random_state': 42,
-        'n_jobs': -1
+        # Same names as XGBRegressor's, the native API accepts them as aliases
+        'objective': 'reg:squarederror',
+        'tree_method': 'hist',
+        'seed': 42,
+        'nthread': n_threads
     }
-        
-    
-    model = XGBRegressor(**params)
 
-    score = cross_val_score(model, X, y.ravel(), cv=5, 
-                               scoring=make_scorer(median_absolute_percentage_error), n_jobs=1).mean()
+    def fit_fold(index, fold):
+        fit, stop, valid = folds.xgboost()[index]
+        booster = xgb.train(params, fit, num_boost_round=XGBOOST_MAX_ROUNDS, evals=[(stop, 'stop')],
+                            early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False)
+        return booster.predict(valid, iteration_range=(0, booster.best_iteration + 1)), booster.best_iteration + 1
 
-    return score
+    return cross_validate(trial, fit_fold, folds)
 
-def objective_lightgbm(trial, X = None, y = None):
+def objective_lightgbm(trial, folds = None, n_threads = -1):
     params = {
-        'n_estimators': trial.suggest_int('n_estimators', 100, 800),
         'max_depth': trial.suggest_int('max_depth', 3, 12),
         'learning_rate': trial.suggest_float('learning_rate', 0.01, 0.3, log=True),
         'num_leaves': trial.suggest_int('num_leaves', 20, 200),
@@ -67,17 +191,22 @@ def objective_lightgbm(trial, X = None, y = None):
         'min_child_samples': trial.suggest_int('min_child_samples', 10, 50),
         'reg_alpha': trial.suggest_float('reg_alpha', 0, 0.1),
         'reg_lambda': trial.suggest_float('reg_lambda', 0, 0.1),
-        'random_state': 42,
+        'objective': 'regression',
+        'seed': 42,
+        'num_threads': n_threads,
         'verbose': -1
         }
-        
-    model = LGBMRegressor(**params)
 
-    score = cross_val_score(model, X, y.ravel(), cv=5, 
-                           scoring=make_scorer(median_absolute_percentage_error), n_jobs=1).mean()
-    return score
+    def fit_fold(index, fold):
+        fit, stop = folds.lightgbm()[index]
+        booster = lgb.train(params, fit, num_boost_round=LIGHTGBM_MAX_ROUNDS, valid_sets=[stop],
+                            callbacks=[lgb.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)])
+        best_iteration = booster.best_iteration or LIGHTGBM_MAX_ROUNDS
+        return booster.predict(fold.X_valid, num_iteration=best_iteration), best_iteration
 
-def objective_elastic_net(trial, X=None, y=None):
+    return cross_validate(trial, fit_fold, folds)
+
+def objective_elastic_net(trial, folds=None, n_threads=-1):
 
     params = {
         'alpha': trial.suggest_float('alpha', 1e-4, 10, log=True),
@@ -87,22 +216,80 @@ def objective_elastic_net(trial, X=None, y=None):
         'random_state': 42
     }
 
-    model = ElasticNet(**params)
+    def fit_fold(index, fold):
+        return ElasticNet(**params).fit(fold.X_train, fold.y_train).predict(fold.X_valid), None
 
-    score = cross_val_score(model, X, y.ravel(), cv=5, 
-                           scoring=make_scorer(median_absolute_percentage_error), n_jobs=1).mean()
-    return score
+    return cross_validate(trial, fit_fold, folds)
 
 
 # Hyperparameters
-def optimize_hyperparameters(objective_func, X_train, y_train, n_trials=50,n_jobs=-1):
-    study = optuna.create_study(direction='minimize', sampler=optuna.samplers.RandomSampler(seed=42)) # Default is random Search
+def best_params(study) -> dict:
+    """Best suggested params, plus the early-stopped `n_estimators` of boosters."""
+    params = dict(study.best_params)
+    if "n_estimators" in study.best_trial.user_attrs:
+        params["n_estimators"] = study.best_trial.user_attrs["n_estimators"]
+    return params
+
+def plan_parallelism(cores=None, concurrent_trials=None):
+    """
+    (concurrent trials, threads per trial) so that trials x threads never exceeds `cores`.
+    Without an explicit number of concurrent trials each one gets THREADS_PER_TRIAL threads.
+    """
+    cores = cores or os.process_cpu_count() or 1
+    if not concurrent_trials or concurrent_trials < 1:
+        concurrent_trials = max(1, cores // THREADS_PER_TRIAL)
+    concurrent_trials = min(concurrent_trials, cores)
+    return concurrent_trials, max(1, cores // concurrent_trials)
+
+def journal_storage(path):
+    # A journal file is safe to share between processes, unlike an in-memory storage
+    return JournalStorage(JournalFileBackend(path))
+
+def _optimize_worker(study_name, storage_path, objective_func, X, y, n_trials, n_threads, sampler, pruner, seed):
+    study = optuna.load_study(study_name=study_name, storage=journal_storage(storage_path),
+                              sampler=SAMPLERS[sampler](seed), pruner=PRUNERS[pruner]())
+    # Stops every worker once the study as a whole has n_trials finished trials
+    stop = optuna.study.MaxTrialsCallback(n_trials, states=(optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED))
+    # Native datasets can't be pickled, each worker builds the folds once for all its trials
+    folds = CVFolds(X, y)
+    with threadpool_limits(limits=n_threads):
+        study.optimize(partial(objective_func, folds=folds, n_threads=n_threads), n_trials=n_trials, callbacks=[stop])
+
+def run_study(objective_func, X_train, y_train, n_trials=50, sampler="tpe", pruner="median", seed=42,
+              cores=None, concurrent_trials=None, executor="thread", storage_path=None, study_name="hpo"):
+    """
+    Run the search with the core budget split between concurrent trials and per-model threads.
+    `executor="process"` runs one process per concurrent trial, all sharing a journal storage.
+    """
+    workers, n_threads = plan_parallelism(cores, concurrent_trials)
+    X, y = np.asarray(X_train), np.asarray(y_train)
+
+    if executor == "thread":
+        storage = journal_storage(storage_path) if storage_path else None
+        study = optuna.create_study(study_name=study_name, storage=storage, direction='minimize', load_if_exists=True,
+                                    sampler=SAMPLERS[sampler](seed), pruner=PRUNERS[pruner]())
+        # Also caps BLAS/OpenMP pools the models don't expose a thread count for
+        folds = CVFolds(X, y)
+        with threadpool_limits(limits=n_threads):
+            study.optimize(partial(objective_func, folds=folds, n_threads=n_threads), n_trials=n_trials, n_jobs=workers, show_progress_bar=True)
+        return study
 
-    objective = partial(objective_func, X=X_train, y = y_train)
-    
-    # Use it like this:
-    study.optimize(objective, n_trials=n_trials, n_jobs=n_jobs, show_progress_bar=True)
+    storage_path = storage_path or os.path.join(tempfile.mkdtemp(prefix="optuna-"), "journal.log")
+    optuna.create_study(study_name=study_name, storage=journal_storage(storage_path), direction='minimize', load_if_exists=True)
+    # Spawned, a forked child can deadlock on the OpenMP pools the parent's boosters already started
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # Different seeds, otherwise every worker would sample the same startup trials
+        futures = [
+            pool.submit(_optimize_worker, study_name, storage_path, objective_func, X, y, n_trials, n_threads, sampler, pruner, seed + worker)
+            for worker in range(workers)
+        ]
+        for future in futures:
+            future.result()
+    return optuna.load_study(study_name=study_name, storage=journal_storage(storage_path))
 
-    best_params = study.best_params
-    
-    return best_params
\ No newline at end of file
+def optimize_hyperparameters(objective_func, X_train, y_train, n_trials=50, n_jobs=None, sampler="tpe", pruner="median", seed=42,
+                             cores=None, executor="thread"):
+    """Best params of a search where `n_jobs` concurrent trials (default: from the core budget) share `cores`."""
+    study = run_study(objective_func, X_train, y_train, n_trials, sampler, pruner, seed,
+                      cores=cores, concurrent_trials=n_jobs, executor=executor)
+    return best_params(study)
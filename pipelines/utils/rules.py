@@ -0,0 +1,110 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.json")
+
+# Rule operator -> (MongoDB query operator, vectorized pandas comparison)
+OPERATORS = {
+    "eq": ("$eq", lambda column, value: column == value),
+    "ne": ("$ne", lambda column, value: column != value),
+    "lt": ("$lt", lambda column, value: column < value),
+    "lte": ("$lte", lambda column, value: column <= value),
+    "gt": ("$gt", lambda column, value: column > value),
+    "gte": ("$gte", lambda column, value: column >= value),
+    "in": ("$in", lambda column, value: column.isin(value)),
+}
+
+
+def load_rules(config_path: str = CONFIG_PATH) -> list[dict]:
+    """
+    Cleaning rules from config.json. Each rule marks a listing as erroneous when
+    `<field> <op> <value>`, optionally only for some `property_types`.
+    """
+    with open(config_path, "r") as f:
+        rules = json.load(f).get("cleaning_rules", [])
+    for rule in rules:
+        if rule["op"] not in OPERATORS:
+            raise ValueError(f"Unknown operator {rule['op']!r} in cleaning rule {rule['name']!r}")
+    return rules
+
+
+def rule_filter(rule: dict) -> dict:
+    query = {rule["field"]: {OPERATORS[rule["op"]][0]: rule["value"]}}
+    if rule.get("property_types"):
+        query["PROPERTY_TYPE"] = {"$in": rule["property_types"]}
+    return query
+
+
+def compile_filter(rules: list[dict]) -> dict:
+    """All rules as one `$or` filter, so a collection is cleaned with a single `delete_many`."""
+    return {"$or": [rule_filter(rule) for rule in rules]} if rules else {"_id": {"$exists": False}}
+
+
+def compile_mask(df: pd.DataFrame, rules: list[dict]) -> np.ndarray:
+    """Boolean mask of the rows any rule matches. Missing values only match `ne`, as in MongoDB."""
+    mask = np.zeros(len(df), dtype=bool)
+    for rule in rules:
+        if rule["field"] not in df.columns:
+            continue
+        matches = OPERATORS[rule["op"]][1](df[rule["field"]], rule["value"])
+        if rule.get("property_types"):
+            matches &= df["PROPERTY_TYPE"].isin(rule["property_types"])
+        mask |= matches.fillna(False).to_numpy(dtype=bool)
+    return mask
+
+
+def compile_expression(rules: list[dict], columns: list[str]) -> pc.Expression:
+    """
+    All rules as one Arrow expression, for tables and Parquet datasets. Rows with a missing
+    value evaluate to null rather than True, so fill nulls with False before using it as a mask.
+    Only `ne` matches a missing value, as MongoDB's `$ne` does.
+    """
+    expression = pc.scalar(False)
+    for rule in rules:
+        if rule["field"] not in columns:
+            continue
+        matches = OPERATORS[rule["op"]][1](pc.field(rule["field"]), rule["value"])
+        if rule["op"] == "ne":
+            matches |= pc.field(rule["field"]).is_null()
+        if rule.get("property_types"):
+            matches &= pc.field("PROPERTY_TYPE").isin(rule["property_types"])
+        expression |= matches
+    return expression
+
+
+def _plan_stages(plan: dict) -> list[str]:
+    stages = [plan.get("stage")]
+    for child in [plan.get("inputStage")] + plan.get("inputStages", []):
+        if child:
+            stages += _plan_stages(child)
+    return [stage for stage in stages if stage]
+
+
+def explain_filter(collection, query: dict) -> dict:
+    """Matched count plus the winning plan and its cost, from `explain` with execution stats."""
+    explain = collection.find(query).explain()
+    planner = explain.get("queryPlanner", {})
+    winning = planner.get("winningPlan", {})
+    execution = explain.get("executionStats", {})
+    return {
+        "matched": collection.count_documents(query),
+        "stages": _plan_stages(winning.get("queryPlan", winning)),
+        "docs_examined": execution.get("totalDocsExamined"),
+        "keys_examined": execution.get("totalKeysExamined"),
+        "millis": execution.get("executionTimeMillis"),
+    }
+
+
+def dry_run(collection, rules: list[dict], scope: dict | None = None) -> dict:
+    """
+    What the cleaning delete would do, rule by rule and combined, without deleting anything.
+    `scope` restricts it to some documents, e.g. those past the cleaning watermark.
+    """
+    scoped = (lambda query: {"$and": [scope, query]}) if scope else (lambda query: query)
+    report = {rule["name"]: explain_filter(collection, scoped(rule_filter(rule))) for rule in rules}
+    report["all_rules"] = explain_filter(collection, scoped(compile_filter(rules)))
+    return report
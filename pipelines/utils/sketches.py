@@ -0,0 +1,73 @@
+import math
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+
+class DDSketch:
+    """
+    Mergeable quantile sketch with relative-error guarantees (DDSketch, Masson et al. 2019).
+
+    Positive values land in logarithmic buckets `ceil(log_gamma(x))`, values <= 0 in a zero
+    bucket, so any quantile is within `relative_accuracy` of the true value. Merging is adding
+    bucket counts, which is what lets cleaning fold in new batches without rescanning history.
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY, bins: dict[int, int] | None = None, zero_count: int = 0):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.bins = dict(bins or {})
+        self.zero_count = zero_count
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.bins.values())
+
+    def key(self, value: float) -> int | None:
+        return math.ceil(math.log(value) / math.log(self.gamma)) if value > 0 else None
+
+    def add(self, value: float, count: int = 1):
+        key = self.key(value)
+        if key is None:
+            self.zero_count += count
+        else:
+            self.bins[key] = self.bins.get(key, 0) + count
+
+    def add_bucket(self, key: int | None, count: int):
+        if key is None:
+            self.zero_count += count
+        else:
+            self.bins[key] = self.bins.get(key, 0) + count
+
+    def merge(self, other: 'DDSketch'):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches with the same relative accuracy can be merged")
+        self.zero_count += other.zero_count
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+
+    def quantile(self, q: float) -> float | None:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_dict(self) -> dict:
+        # Mongo document keys must be strings
+        return {"relative_accuracy": self.relative_accuracy, "zero_count": self.zero_count, "bins": {str(k): v for k, v in self.bins.items()}}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'DDSketch':
+        return cls(data["relative_accuracy"], {int(k): v for k, v in data["bins"].items()}, data["zero_count"])
+
+
+def bucket_expression(value: str, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> dict:
+    """The same bucket key as `DDSketch.key`, as a MongoDB expression (null for the zero bucket)."""
+    log_gamma = math.log((1 + relative_accuracy) / (1 - relative_accuracy))
+    return {"$cond": [{"$gt": [value, 0]}, {"$ceil": {"$divide": [{"$ln": value}, log_gamma]}}, None]}
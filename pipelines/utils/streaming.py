@@ -0,0 +1,158 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+import pyarrow as pa
+
+_DONE = object()
+
+
+@dataclass
+class StageMetrics:
+    name: str
+    items: int = 0
+    batches: int = 0
+    busy_seconds: float = 0.0     # time spent doing the stage's own work
+    blocked_seconds: float = 0.0  # time spent waiting for room in the downstream queue (backpressure)
+    queue_samples: int = 0
+    queue_total: int = 0
+    queue_max: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    def sample_queue(self, queue: asyncio.Queue):
+        size = queue.qsize()
+        self.queue_samples += 1
+        self.queue_total += size
+        self.queue_max = max(self.queue_max, size)
+
+    def summary(self) -> dict:
+        wall = time.monotonic() - self.started
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "batches": self.batches,
+            "items_per_sec": self.items / wall if wall else 0.0,
+            "busy_pct": 100 * self.busy_seconds / wall if wall else 0.0,
+            "blocked_pct": 100 * self.blocked_seconds / wall if wall else 0.0,
+            "queue_mean": self.queue_total / self.queue_samples if self.queue_samples else 0.0,
+            "queue_max": self.queue_max,
+        }
+
+
+@dataclass
+class Chunk:
+    key: str                # destination, e.g. the operation collection
+    pages: list             # page references whose rows are all in this chunk
+    parts: list             # record batches / tables sharing one schema
+
+    @property
+    def rows(self) -> int:
+        return sum(part.num_rows for part in self.parts)
+
+    def table(self) -> pa.Table:
+        return pa.concat_tables([pa.Table.from_batches([part]) if isinstance(part, pa.RecordBatch) else part for part in self.parts])
+
+
+class StreamingPipeline:
+    """
+    fetch -> embed -> write, overlapped through bounded asyncio queues.
+
+    Producers `await put(...)` whole pages as Arrow record batches and block once
+    `max_pending_pages` are queued (backpressure). The embed stage groups pages into tables of
+    at least `embed_batch_size` rows and runs `embed_fn(key, table)` in a worker thread, passing
+    on the table it returns (so it may drop unchanged rows); the write stage groups embedded
+    tables into at least `write_batch_size` rows and runs `write_fn(key, table)` in a worker
+    thread, then `on_written(key, pages)`. Pages are never split, so `on_written` only ever
+    sees pages whose rows are all stored. Memory is bounded by the queue sizes plus what the
+    producers hold, so producers must not fetch ahead of `put` (`crawl_segment` holds at most
+    two pages per worker).
+    """
+
+    def __init__(self, embed_fn: Callable, write_fn: Callable, on_written: Callable | None = None,
+                 embed_batch_size: int = 64, write_batch_size: int = 512,
+                 max_pending_pages: int = 16, max_pending_batches: int = 4):
+        self.embed_fn = embed_fn
+        self.write_fn = write_fn
+        self.on_written = on_written or (lambda key, pages: None)
+        self.embed_batch_size = embed_batch_size
+        self.write_batch_size = write_batch_size
+        self._pages = asyncio.Queue(maxsize=max_pending_pages)
+        self._embedded = asyncio.Queue(maxsize=max_pending_batches)
+        self.metrics = {name: StageMetrics(name) for name in ("fetch", "embed", "write")}
+        self._tasks = []
+
+    async def __aenter__(self) -> 'StreamingPipeline':
+        self._tasks = [asyncio.create_task(self._embed_stage()), asyncio.create_task(self._write_stage())]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            return
+        await self._pages.put(_DONE)
+        await asyncio.gather(*self._tasks)
+
+    async def put(self, key: str, page, batch: pa.RecordBatch):
+        metrics = self.metrics["fetch"]
+        metrics.sample_queue(self._pages)
+        start = time.monotonic()
+        # Wait on the stages too: if one of them dies the queue never drains and we'd block forever
+        put = asyncio.ensure_future(self._pages.put(Chunk(key, [page], [batch])))
+        await asyncio.wait([put, *self._tasks], return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            failed = next(task for task in self._tasks if task.done())
+            raise RuntimeError("Streaming pipeline stage stopped early") from failed.exception()
+        metrics.blocked_seconds += time.monotonic() - start
+        metrics.items += batch.num_rows
+        metrics.batches += 1
+
+    async def _flush(self, stage: str, chunk: Chunk, work: Callable, downstream: asyncio.Queue | None):
+        metrics = self.metrics[stage]
+        start = time.monotonic()
+        await asyncio.to_thread(work, chunk)
+        metrics.busy_seconds += time.monotonic() - start
+        metrics.items += chunk.rows
+        metrics.batches += 1
+
+        if downstream is not None:
+            metrics.sample_queue(downstream)
+            start = time.monotonic()
+            await downstream.put(chunk)
+            metrics.blocked_seconds += time.monotonic() - start
+
+    async def _batched(self, queue: asyncio.Queue, batch_size: int, stage: str, work: Callable, downstream: asyncio.Queue | None):
+        buffers: dict[str, Chunk] = {}
+        while True:
+            chunk = await queue.get()
+            if chunk is _DONE:
+                break
+            buffer = buffers.setdefault(chunk.key, Chunk(chunk.key, [], []))
+            buffer.pages.extend(chunk.pages)
+            buffer.parts.extend(chunk.parts)
+            if buffer.rows >= batch_size:
+                await self._flush(stage, buffers.pop(chunk.key), work, downstream)
+
+        for buffer in buffers.values():
+            await self._flush(stage, buffer, work, downstream)
+        if downstream is not None:
+            await downstream.put(_DONE)
+
+    async def _embed_stage(self):
+        def embed(chunk: Chunk):
+            # Empty pages are dropped here, the write stage only ever sees the embedded schema
+            chunk.parts = [self.embed_fn(chunk.key, chunk.table())] if chunk.rows else []
+        await self._batched(self._pages, self.embed_batch_size, "embed", embed, self._embedded)
+
+    async def _write_stage(self):
+        def write(chunk: Chunk):
+            if chunk.rows:
+                self.write_fn(chunk.key, chunk.table())
+            self.on_written(chunk.key, chunk.pages)
+        await self._batched(self._embedded, self.write_batch_size, "write", write, None)
+
+    def report(self) -> list[dict]:
+        return [m.summary() for m in self.metrics.values()]
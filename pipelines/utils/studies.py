@@ -0,0 +1,121 @@
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator
+
+import numpy as np
+import optuna
+import pandas as pd
+import pyarrow.fs as pafs
+
+from . import optimize as op
+from .archive import _filesystem
+
+# Local path or any URI pyarrow understands, remote journals are copied down for the search and back up after it
+STUDIES_URI = os.getenv("HPO_STUDIES_URI", "data/studies")
+# Best trials of the previous study that are evaluated first in the next one
+WARM_START_TRIALS = 5
+# Trial budget of a warm-started search when the data moved less than DRIFT_THRESHOLD
+SMALL_DRIFT_TRIALS = 10
+DRIFT_THRESHOLD = 0.05
+FINGERPRINT_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+
+def study_key(model_type: str, features: list[str]) -> str:
+    # The feature set is part of the key, studies over other features don't carry over
+    features_key = hashlib.sha1(",".join(features).encode()).hexdigest()[:12]
+    return f"{model_type}-features-{features_key}"
+
+
+def data_fingerprint(df: pd.DataFrame) -> dict:
+    """Row count and a few quantiles of each numeric column, small enough to keep in the study's user attrs."""
+    quantiles = {name: np.nanquantile(df[name].to_numpy(dtype=float), FINGERPRINT_QUANTILES).tolist() for name in df.columns}
+    return {"rows": len(df), "quantiles": quantiles}
+
+
+def data_drift(previous: dict, current: dict) -> float:
+    """
+    Largest relative change between two fingerprints: of the row count, and of any column's
+    quantiles measured in its previous interquartile range. Infinite if the columns differ.
+    """
+    if previous["quantiles"].keys() != current["quantiles"].keys():
+        return float("inf")
+    drift = abs(current["rows"] - previous["rows"]) / max(previous["rows"], 1)
+    for name, before in previous["quantiles"].items():
+        before, after = np.asarray(before), np.asarray(current["quantiles"][name])
+        scale = (before[3] - before[1]) or abs(before[2]) or 1.0
+        drift = max(drift, float(np.max(np.abs(after - before)) / scale))
+    return drift
+
+
+def trial_budget(n_trials: int, drift: float | None) -> int:
+    if drift is not None and drift <= DRIFT_THRESHOLD:
+        return min(n_trials, SMALL_DRIFT_TRIALS)
+    return n_trials
+
+
+@contextmanager
+def journal_file(key: str, uri: str = STUDIES_URI) -> Iterator[str]:
+    """Local path of a key's journal. A remote one is downloaded first and uploaded again if the block succeeds."""
+    fs, root = _filesystem(uri)
+    path = f"{root}/{key}.log"
+    if isinstance(fs, pafs.LocalFileSystem):
+        fs.create_dir(root, recursive=True)
+        yield path
+        return
+
+    local_fs = pafs.LocalFileSystem()
+    local = os.path.join(tempfile.mkdtemp(prefix="optuna-"), f"{key}.log")
+    if fs.get_file_info(path).type == pafs.FileType.File:
+        pafs.copy_files(path, local, source_filesystem=fs, destination_filesystem=local_fs)
+    yield local
+    fs.create_dir(root, recursive=True)
+    pafs.copy_files(local, path, source_filesystem=local_fs, destination_filesystem=fs)
+
+
+def previous_study(storage) -> optuna.study.StudySummary | None:
+    """Latest study of the storage that finished its search."""
+    summaries = [s for s in optuna.get_all_study_summaries(storage, include_best_trial=False) if "finished_at" in s.user_attrs]
+    return max(summaries, key=lambda s: s.user_attrs["finished_at"], default=None)
+
+
+def best_trials(storage, study_name: str, n: int = WARM_START_TRIALS) -> list[dict]:
+    """Params of a study's `n` best complete trials, best first."""
+    study = optuna.load_study(study_name=study_name, storage=storage)
+    complete = sorted(study.get_trials(deepcopy=False, states=[optuna.trial.TrialState.COMPLETE]), key=lambda t: t.value)
+    return [trial.params for trial in complete[:n]]
+
+
+def warm_started_search(objective_func, X_train, y_train, key: str, fingerprint: dict, n_trials=50, sampler="tpe",
+                        pruner="median", seed=42, cores=None, executor="thread", uri: str = STUDIES_URI) -> tuple[optuna.Study, dict]:
+    """
+    Search in a new study of the key's journal, seeded with the previous study's best trials.
+    The previous study's data fingerprint decides the budget: a few trials when the data barely
+    moved, the full `n_trials` otherwise or when there is nothing to warm-start from.
+    """
+    with journal_file(key, uri) as path:
+        storage = op.journal_storage(path)
+        previous = previous_study(storage)
+        drift = data_drift(previous.user_attrs["fingerprint"], fingerprint) if previous else None
+        warm_params = best_trials(storage, previous.study_name) if previous else []
+        budget = trial_budget(n_trials, drift)
+
+        created_at = datetime.now(timezone.utc).isoformat()
+        study_name = f"{key}-{created_at}"
+        study = optuna.create_study(study_name=study_name, storage=storage, direction='minimize')
+        study.set_user_attr("fingerprint", fingerprint)
+        study.set_user_attr("warm_started_from", previous.study_name if previous else None)
+        for params in warm_params:
+            study.enqueue_trial(params, skip_if_exists=True)
+
+        # A different seed per study, otherwise every run would sample the same startup trials again
+        n_studies = len(optuna.get_all_study_names(storage))
+        study = op.run_study(objective_func, X_train, y_train, budget, sampler, pruner, seed + n_studies - 1,
+                             cores=cores, executor=executor, storage_path=path, study_name=study_name)
+        study.set_user_attr("finished_at", datetime.now(timezone.utc).isoformat())
+
+    info = {"study": study_name, "previous_study": previous.study_name if previous else None,
+            "drift": drift, "n_trials": budget, "warm_start_trials": len(warm_params)}
+    return study, info
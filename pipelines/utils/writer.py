@@ -0,0 +1,95 @@
+import hashlib
+from datetime import datetime
+
+import orjson
+import pyarrow as pa
+from pymongo import UpdateOne
+
+PRICE_HISTORY_COLLECTION = "price_history"
+# The price as scraped, PRICE itself may be capped later by the cleaning steps
+RAW_PRICE_FIELD = "RAW_PRICE"
+
+# Bookkeeping fields that change on every scrape and must not count as a content change
+HASH_EXCLUDED_FIELDS = {"_id", "embedding", "scraped_at", "batch_id", "content_hash", "first_seen_at", RAW_PRICE_FIELD}
+
+
+def content_hashes(table: pa.Table) -> list[str]:
+    """
+    One hash per row over the listing content. Each row is hashed from its own canonical JSON
+    (sorted keys, Arrow values as Python scalars), so a row hashes the same whatever else is in
+    its batch, unlike pandas' row hashing whose dtypes depend on the batch's nulls.
+    """
+    content = table.drop_columns([name for name in table.column_names if name in HASH_EXCLUDED_FIELDS])
+    return [hashlib.sha1(orjson.dumps(row, option=orjson.OPT_SORT_KEYS)).hexdigest()[:16] for row in content.to_pylist()]
+
+
+class ListingWriter:
+    """
+    Change-aware writer for scraped listings, fed Arrow tables.
+
+    `select_changed` drops rows whose content hash matches the stored one (so they are
+    neither re-embedded nor rewritten), `write` upserts the rest with one `bulk_write` per
+    collection and appends every observed price to a monthly bucket in `price_history`.
+    Price changes are detected against the stored `RAW_PRICE`, never the cleaned `PRICE`.
+    Rows only become Python dicts at the `bulk_write` boundary.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._previous_prices: dict[str, float | None] = {}
+        self.db[PRICE_HISTORY_COLLECTION].create_index([('operation', 1), ('month', 1)])
+
+    def select_changed(self, operation: str, table: pa.Table) -> pa.Table:
+        hashes = content_hashes(table)
+        ids = table.column('_id').to_pylist()
+        table = table.append_column('content_hash', pa.array(hashes, pa.string()))
+
+        stored = {
+            doc['_id']: doc
+            for doc in self.db[operation].find({'_id': {'$in': ids}}, {'content_hash': 1, RAW_PRICE_FIELD: 1})
+        }
+
+        changed = []
+        for _id, row_hash in zip(ids, hashes):
+            previous = stored.get(_id)
+            is_changed = previous is None or previous.get('content_hash') != row_hash
+            if is_changed:
+                self._previous_prices[_id] = previous.get(RAW_PRICE_FIELD) if previous else None
+            changed.append(is_changed)
+        return table.filter(pa.array(changed, pa.bool_()))
+
+    def write(self, operation: str, table: pa.Table) -> dict:
+        now = datetime.now()
+        listing_requests = []
+        history_requests = []
+
+        for item in table.to_pylist():
+            fields = {k: v for k, v in item.items() if k != '_id'}
+            fields[RAW_PRICE_FIELD] = item.get('PRICE')
+            listing_requests.append(UpdateOne(
+                {'_id': item['_id']},
+                {'$set': fields, '$setOnInsert': {'first_seen_at': item.get('scraped_at') or now}},
+                upsert=True
+            ))
+
+            previous_price = self._previous_prices.pop(item['_id'], None)
+            if item.get('PRICE') is not None and item.get('PRICE') != previous_price:
+                observed_at = item.get('scraped_at') or now
+                month = observed_at.strftime('%Y-%m')
+                history_requests.append(UpdateOne(
+                    {'_id': f"{item['_id']}:{month}"},
+                    {
+                        '$setOnInsert': {'listing_id': item['_id'], 'WEB_PROPERTY_CODE': item.get('WEB_PROPERTY_CODE'), 'operation': operation, 'month': month},
+                        '$push': {'prices': {'at': observed_at, 'price': item['PRICE'], 'previous': previous_price}},
+                    },
+                    upsert=True
+                ))
+
+        stats = {'upserted': 0, 'modified': 0, 'price_changes': len(history_requests)}
+        if listing_requests:
+            result = self.db[operation].bulk_write(listing_requests, ordered=False)
+            stats['upserted'] = result.upserted_count
+            stats['modified'] = result.modified_count
+        if history_requests:
+            self.db[PRICE_HISTORY_COLLECTION].bulk_write(history_requests, ordered=False)
+        return stats
@@ -0,0 +1,101 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import multiprocessing
+import resource
+import time
+from functools import partial
+
+import lightgbm as lgb
+import numpy as np
+import optuna
+from lightgbm import LGBMRegressor
+from sklearn.model_selection import KFold, train_test_split
+from xgboost import XGBRegressor
+
+from pipelines.utils import optimize as op
+from pipelines.utils.evaluate import median_absolute_percentage_error
+from tests.bench_optimize import synthetic_listings
+
+# Sampled part of each search space, the rest is fixed so both paths train the same models
+XGBOOST_SPACE = {"learning_rate": (0.01, 0.3), "subsample": (0.6, 1.0), "colsample_bytree": (0.6, 1.0)}
+LIGHTGBM_SPACE = {"learning_rate": (0.01, 0.3), "feature_fraction": (0.7, 1.0), "bagging_fraction": (0.7, 1.0)}
+
+
+def resliced_trial(model: str, params: dict, X, y, n_threads: int) -> float:
+    # Previous path: every trial slices the folds again and the sklearn wrappers re-bin them
+    scores = []
+    for train_index, valid_index in KFold(n_splits=op.N_FOLDS).split(X):
+        X_fit, X_stop, y_fit, y_stop = train_test_split(X[train_index], y[train_index], test_size=op.EARLY_STOPPING_FRACTION, random_state=42)
+        if model == "xgboost":
+            regressor = XGBRegressor(**params, n_estimators=op.XGBOOST_MAX_ROUNDS, early_stopping_rounds=op.EARLY_STOPPING_ROUNDS,
+                                     random_state=42, n_jobs=n_threads)
+            regressor.fit(X_fit, y_fit, eval_set=[(X_stop, y_stop)], verbose=False)
+        else:
+            regressor = LGBMRegressor(**params, n_estimators=op.LIGHTGBM_MAX_ROUNDS, random_state=42, n_jobs=n_threads, verbose=-1)
+            regressor.fit(X_fit, y_fit, eval_set=[(X_stop, y_stop)], callbacks=[lgb.early_stopping(op.EARLY_STOPPING_ROUNDS, verbose=False)])
+        scores.append(median_absolute_percentage_error(y[valid_index], regressor.predict(X[valid_index])))
+    return float(np.mean(scores))
+
+
+def shared_trial(model: str, params: dict, folds, n_threads: int) -> float:
+    objective = {"xgboost": op.objective_xgboost, "lightgbm": op.objective_lightgbm}[model]
+    return objective(optuna.trial.FixedTrial(params), folds=folds, n_threads=n_threads)
+
+
+def fixed_trials(model: str, n_trials: int, seed: int = 42) -> list[dict]:
+    """The same parameter sets for both paths, the rest of each objective's space at a fixed value."""
+    rng = np.random.default_rng(seed)
+    space = XGBOOST_SPACE if model == "xgboost" else LIGHTGBM_SPACE
+    trials = []
+    for _ in range(n_trials):
+        params = {name: float(rng.uniform(low, high)) for name, (low, high) in space.items()}
+        params["max_depth"] = int(rng.integers(3, 13))
+        if model == "xgboost":
+            params.update({"gamma": 0.0, "min_child_weight": 1, "reg_alpha": 0.0, "reg_lambda": 1.0})
+        else:
+            params.update({"num_leaves": 63, "bagging_freq": 1, "min_child_samples": 20, "reg_alpha": 0.0, "reg_lambda": 0.0})
+        trials.append(params)
+    return trials
+
+
+def run_path(path: str, model: str, rows: int, n_trials: int, n_threads: int) -> dict:
+    """Runs in its own process, so ru_maxrss is this path's peak only."""
+    X, y = synthetic_listings(rows)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    setup_start = time.perf_counter()
+    folds = op.CVFolds(X, y) if path == "shared" else None
+    setup = time.perf_counter() - setup_start
+
+    times = []
+    for params in fixed_trials(model, n_trials):
+        start = time.perf_counter()
+        if path == "shared":
+            shared_trial(model, params, folds, n_threads)
+        else:
+            resliced_trial(model, params, X, y, n_threads)
+        times.append(time.perf_counter() - start)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"setup": setup, "times": times, "peak_mb": peak / 1024, "delta_mb": (peak - baseline) / 1024}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trial wall-time and peak memory: re-sliced folds vs shared folds with native datasets")
+    parser.add_argument("--model", choices=["xgboost", "lightgbm"], default="xgboost")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--trials", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=os.process_cpu_count())
+    args = parser.parse_args()
+
+    print(f"🧪 {args.model}: {args.trials} trials x {op.N_FOLDS} folds on {args.rows} rows, {args.threads} threads")
+    context = multiprocessing.get_context("spawn")
+    for path in ["resliced", "shared"]:
+        with context.Pool(1) as pool:
+            result = pool.apply(partial(run_path, path, args.model, args.rows, args.trials, args.threads))
+        times = np.array(result["times"])
+        # The first shared trial also builds the native datasets
+        print(f"  {path:<9} setup {result['setup']:6.2f} s | trial mean {times.mean():6.2f} s, median {np.median(times):6.2f} s, "
+              f"first {times[0]:6.2f} s | peak RSS {result['peak_mb']:7.1f} MB (+{result['delta_mb']:6.1f} MB over the data)")
@@ -0,0 +1,59 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+
+from pipelines.utils.finca_raiz import FincaRaizClient, HEADERS, build_search_payload, parse_hits
+
+MOCK_PORT = 8765
+
+PAGES = 200
+ROWS = 32
+LATENCY = 0.05
+REPEATS = 3  # best of, the numbers are noisy on small machines
+
+
+def legacy_get_hits(url, rows, page):
+    # Previous behaviour: one un-pooled request per page, no timeout and no retry
+    payload = build_search_payload(rows, page, 2, 2)
+    return parse_hits(requests.request("POST", url, json=payload, headers=HEADERS).json())
+
+
+def bench_legacy(api_url: str) -> float:
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=8) as executor:
+        list(executor.map(legacy_get_hits, [f"{api_url}/properties/search"] * PAGES, [ROWS] * PAGES, range(1, PAGES + 1)))
+    return PAGES / (time.perf_counter() - start)
+
+
+async def bench_async(api_url: str, concurrency: int, rate_limit: float) -> float:
+    start = time.perf_counter()
+    async with FincaRaizClient(rate_limit=rate_limit, max_concurrency=concurrency, api_url=api_url) as client:
+        await asyncio.gather(*[client.get_hits(ROWS, page, 2, 2) for page in range(1, PAGES + 1)])
+    return PAGES / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    # The mock runs in its own process so it doesn't compete with the client for the GIL
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(__file__), "mock_finca_raiz.py"),
+         "--port", str(MOCK_PORT), "--latency", str(LATENCY), "--total-hits", str(PAGES * ROWS)],
+        stdout=subprocess.PIPE, text=True
+    )
+    server.stdout.readline()
+    api_url = f"http://127.0.0.1:{MOCK_PORT}/api/v1"
+    print(f"🧪 Benchmarking {PAGES} pages x {ROWS} rows against {api_url} ({LATENCY * 1000:.0f} ms latency)")
+
+    legacy = max(bench_legacy(api_url) for _ in range(REPEATS))
+    print(f"  legacy requests + ProcessPool(8): {legacy:7.1f} pages/s")
+    for concurrency in (8, 16, 32):
+        pages_per_sec = max(asyncio.run(bench_async(api_url, concurrency, rate_limit=1000)) for _ in range(REPEATS))
+        print(f"  FincaRaizClient concurrency={concurrency:<3}:   {pages_per_sec:7.1f} pages/s")
+
+    server.terminate()
@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import time
+from functools import partial
+
+import numpy as np
+import optuna
+
+from pipelines.utils import optimize as op
+from tests.bench_optimize import synthetic_listings
+
+OBJECTIVES = {"xgboost": op.objective_xgboost, "lightgbm": op.objective_lightgbm, "random_forest": op.objective_random_forest}
+
+
+def bench_oversubscribed(objective, X, y, n_trials: int, cores: int) -> float:
+    # Previous behaviour: one thread per core running trials, each model also asking for every core
+    study = optuna.create_study(direction='minimize', sampler=op.SAMPLERS["random"](42), pruner=op.PRUNERS["none"]())
+    start = time.perf_counter()
+    study.optimize(partial(objective, folds=op.CVFolds(X, y), n_threads=-1), n_trials=n_trials, n_jobs=cores)
+    return n_trials / (time.perf_counter() - start) * 3600
+
+
+def bench_split(objective, X, y, n_trials: int, cores: int, concurrent_trials: int, executor: str) -> float:
+    start = time.perf_counter()
+    study = op.run_study(objective, X, y, n_trials, sampler="random", pruner="none", cores=cores,
+                         concurrent_trials=concurrent_trials, executor=executor)
+    finished = len([t for t in study.trials if t.state.is_finished()])
+    return finished / (time.perf_counter() - start) * 3600
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HPO throughput (trials/hour) for different splits of the core budget")
+    parser.add_argument("--model", choices=sorted(OBJECTIVES), default="xgboost")
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--trials", type=int, default=32)
+    parser.add_argument("--cores", type=int, default=os.process_cpu_count())
+    parser.add_argument("--executors", nargs="+", default=["thread", "process"])
+    args = parser.parse_args()
+
+    optuna.logging.set_verbosity(optuna.logging.ERROR)
+    X, y = synthetic_listings(args.rows)
+    objective = OBJECTIVES[args.model]
+    # Random sampling without pruning, so every split does comparable work
+    print(f"🧪 {args.model}: {args.trials} trials on {args.rows} rows, {args.cores} cores")
+    print(f"  {'oversubscribed (legacy)':<28} {bench_oversubscribed(objective, X, y, args.trials, args.cores):8.1f} trials/h")
+
+    splits = sorted({int(n) for n in np.geomspace(1, args.cores, num=min(args.cores, 6))})
+    for executor in args.executors:
+        for concurrent_trials in splits:
+            workers, threads = op.plan_parallelism(args.cores, concurrent_trials)
+            trials_per_hour = bench_split(objective, X, y, args.trials, args.cores, concurrent_trials, executor)
+            print(f"  {executor:<7} {workers:3d} trials x {threads:3d} threads   {trials_per_hour:8.1f} trials/h")
@@ -0,0 +1,114 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import time
+from functools import partial
+
+import numpy as np
+import optuna
+from sklearn.metrics import make_scorer
+from sklearn.model_selection import cross_val_score
+from lightgbm import LGBMRegressor
+from xgboost import XGBRegressor
+
+from pipelines.utils import optimize as op
+from pipelines.utils.evaluate import median_absolute_percentage_error
+
+
+def synthetic_listings(rows: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """Processed-looking features (scaled numerics + one-hot types) and a log price target."""
+    rng = np.random.default_rng(seed)
+    numeric = rng.normal(size=(rows, 11))
+    types = np.eye(7)[rng.integers(0, 7, rows)]
+    y = 15 + 0.8 * numeric[:, 0] + 0.5 * np.tanh(numeric[:, 1] * numeric[:, 2]) + types @ rng.normal(0, 0.6, 7) + rng.normal(0, 0.25, rows)
+    return np.hstack([numeric, types]), y
+
+
+def legacy_objective_xgboost(trial, X=None, y=None):
+    # Previous behaviour: suggested n_estimators, no early stopping, full 5-fold cross_val_score
+    params = {
+        'n_estimators': trial.suggest_int('n_estimators', 100, 1000),
+        'max_depth': trial.suggest_int('max_depth', 3, 12),
+        'learning_rate': trial.suggest_float('learning_rate', 0.01, 0.3, log=True),
+        'subsample': trial.suggest_float('subsample', 0.6, 1.0),
+        'colsample_bytree': trial.suggest_float('colsample_bytree', 0.6, 1.0),
+        'gamma': trial.suggest_float('gamma', 0, 5),
+        'min_child_weight': trial.suggest_int('min_child_weight', 1, 10),
+        'reg_alpha': trial.suggest_float('reg_alpha', 0, 1),
+        'reg_lambda': trial.suggest_float('reg_lambda', 0, 1),
+        'random_state': 42,
+        'n_jobs': -1
+    }
+    return cross_val_score(XGBRegressor(**params), X, y, cv=5, scoring=make_scorer(median_absolute_percentage_error), n_jobs=1).mean()
+
+
+def legacy_objective_lightgbm(trial, X=None, y=None):
+    params = {
+        'n_estimators': trial.suggest_int('n_estimators', 100, 800),
+        'max_depth': trial.suggest_int('max_depth', 3, 12),
+        'learning_rate': trial.suggest_float('learning_rate', 0.01, 0.3, log=True),
+        'num_leaves': trial.suggest_int('num_leaves', 20, 200),
+        'feature_fraction': trial.suggest_float('feature_fraction', 0.7, 1.0),
+        'bagging_fraction': trial.suggest_float('bagging_fraction', 0.7, 1.0),
+        'bagging_freq': trial.suggest_int('bagging_freq', 1, 5),
+        'min_child_samples': trial.suggest_int('min_child_samples', 10, 50),
+        'reg_alpha': trial.suggest_float('reg_alpha', 0, 0.1),
+        'reg_lambda': trial.suggest_float('reg_lambda', 0, 0.1),
+        'random_state': 42,
+        'verbose': -1
+    }
+    return cross_val_score(LGBMRegressor(**params), X, y, cv=5, scoring=make_scorer(median_absolute_percentage_error), n_jobs=1).mean()
+
+
+OBJECTIVES = {
+    "xgboost": (legacy_objective_xgboost, op.objective_xgboost),
+    "lightgbm": (legacy_objective_lightgbm, op.objective_lightgbm),
+}
+
+
+def run_search(objective, n_trials: int, sampler: str, pruner: str, n_jobs: int) -> tuple[list[tuple[float, float]], optuna.Study]:
+    """(seconds since start, best MDAPE so far) after every finished trial."""
+    study = optuna.create_study(direction='minimize', sampler=op.SAMPLERS[sampler](42), pruner=op.PRUNERS[pruner]())
+    start = time.perf_counter()
+    curve = []
+
+    def record(study, trial):
+        if trial.state == optuna.trial.TrialState.COMPLETE:
+            curve.append((time.perf_counter() - start, study.best_value))
+
+    study.optimize(objective, n_trials=n_trials, n_jobs=n_jobs, callbacks=[record])
+    return curve, study
+
+
+def time_to_reach(curve: list[tuple[float, float]], target: float) -> float | None:
+    return next((elapsed for elapsed, best in curve if best <= target), None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time-to-equal-MDAPE of the HPO search against the previous random search")
+    parser.add_argument("--model", choices=sorted(OBJECTIVES), default="xgboost")
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--trials", type=int, default=50)
+    parser.add_argument("--n-jobs", type=int, default=1, help="Parallel trials of both searches")
+    parser.add_argument("--configs", nargs="+", default=["tpe:median", "tpe:hyperband", "cmaes:median", "random:none"],
+                        help="sampler:pruner pairs to compare")
+    args = parser.parse_args()
+
+    X, y = synthetic_listings(args.rows)
+    legacy, new = OBJECTIVES[args.model]
+    print(f"🧪 {args.model}: {args.trials} trials on {args.rows} rows x {X.shape[1]} features")
+
+    curve, _ = run_search(partial(legacy, X=X, y=y), args.trials, "random", "none", args.n_jobs)
+    target, total = curve[-1][1], curve[-1][0]
+    print(f"  legacy random search:  best MDAPE {target:.5f} in {total:7.1f} s")
+
+    for config in args.configs:
+        sampler, pruner = config.split(":")
+        curve, study = run_search(partial(new, folds=op.CVFolds(X, y)), args.trials, sampler, pruner, args.n_jobs)
+        reached = time_to_reach(curve, target)
+        pruned = len(study.get_trials(states=[optuna.trial.TrialState.PRUNED]))
+        speedup = f"{total / reached:5.1f}x" if reached else "  n/a"
+        print(f"  {config:<16} best MDAPE {curve[-1][1]:.5f} in {curve[-1][0]:7.1f} s, {pruned:3d} pruned | "
+              f"legacy MDAPE reached after {reached if reached is not None else float('nan'):7.1f} s ({speedup})")
@@ -0,0 +1,148 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+import psutil
+
+MOCK_PORT = 8766
+OPERATIONS = ['Arriendo', 'Venta']
+PROPERTIES = ['Apartamento', 'Casa']
+
+# Scraper settings are read at import time, so they point at the mock before anything is imported
+os.environ["FINCA_RAIZ_API_URL"] = f"http://127.0.0.1:{MOCK_PORT}/api/v1"
+os.environ["FINCA_RAIZ_RATE_LIMIT"] = "1000"
+os.environ["RAW_ARCHIVE_URI"] = tempfile.mkdtemp(prefix="bench_raw_archive_")
+
+import backend.utils
+from backend.database import MongoSingleton
+from pipelines.scrapping import scrape_properties_op
+from pipelines.utils.crawler import CHECKPOINT_COLLECTION
+from pipelines.utils.finca_raiz import LOCAL
+from pipelines.utils.writer import PRICE_HISTORY_COLLECTION
+from tests.mock_finca_raiz import MOCK_LINK_PREFIX
+
+
+class MockDataset:
+    def __init__(self, path):
+        self.path = path
+
+
+class Counters:
+    """Counts embedded texts and samples the process RSS while a scenario runs."""
+
+    def __init__(self):
+        self.embeddings = 0
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._embed = backend.utils.embed
+        backend.utils.embed = self._counting_embed  # the op imports embed when it runs
+
+    def _counting_embed(self, text):
+        self.embeddings += len(text) if isinstance(text, list) else 1
+        return self._embed(text)
+
+    def _sample(self):
+        process = psutil.Process()
+        while not self._stop.wait(0.05):
+            self.peak_rss = max(self.peak_rss, process.memory_info().rss)
+
+    def __enter__(self):
+        threading.Thread(target=self._sample, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        backend.utils.embed = self._embed
+
+
+def start_mock(args, id_offset: int, error_rate: float = 0.0) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(__file__), "mock_finca_raiz.py"),
+         "--port", str(MOCK_PORT), "--latency", str(args.latency), "--total-hits", str(args.total_hits),
+         "--max-rows", str(args.max_rows), "--error-rate", str(error_rate), "--id-offset", str(id_offset)],
+        stdout=subprocess.PIPE, text=True
+    )
+    server.stdout.readline()
+    return server
+
+
+def run_scenario(name: str, args, id_offset: int, error_rate: float = 0.0, incremental: bool = False) -> dict:
+    server = start_mock(args, id_offset, error_rate)
+    stats_path = os.path.join(tempfile.gettempdir(), f"bench_scrapping_{name}.csv")
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    try:
+        with Counters() as counters:
+            start = time.perf_counter()
+            scrape_properties_op.python_func(
+                operations=OPERATIONS, properties=PROPERTIES, stats_out=MockDataset(stats_path),
+                run_id=f"bench-{name}-{id_offset}", incremental=incremental
+            )
+            elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+
+    traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    tracemalloc.stop()
+    stats = pd.read_csv(stats_path)
+    pages = int(stats["pages_success"].sum())
+    return {
+        "scenario": name,
+        "seconds": elapsed,
+        "pages": pages,
+        "pages_failed": int(stats["pages_failed"].sum()),
+        "pages_per_sec": pages / elapsed,
+        "embeddings": counters.embeddings,
+        "embeddings_per_sec": counters.embeddings / elapsed,
+        "peak_rss_mb": counters.peak_rss / 2**20,
+        "traced_peak_mb": traced_peak / 2**20 if traced_peak is not None else None,
+    }
+
+
+def cleanup(db):
+    link_pattern = {"$regex": f"^https://www.fincaraiz.com.co{MOCK_LINK_PREFIX}"}
+    for operation in OPERATIONS:
+        ids = [doc["_id"] for doc in db[operation].find({"LINK": link_pattern}, {"_id": 1})]
+        db[operation].delete_many({"_id": {"$in": ids}})
+        db[PRICE_HISTORY_COLLECTION].delete_many({"listing_id": {"$in": ids}})
+    db[CHECKPOINT_COLLECTION].delete_many({"run_id": {"$regex": "^bench-"}})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end scraper benchmark against the local Finca Raíz stand-in")
+    parser.add_argument("--total-hits", type=int, default=2000, help="Listings per (operation, property type) segment")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--max-rows", type=int, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.05, help="503 rate of the flaky scenario")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also trace Python allocations (slower)")
+    args = parser.parse_args()
+
+    db = MongoSingleton(local=LOCAL).client["inmuebles_db"]
+    print(f"🧪 Scraper benchmark: {len(OPERATIONS) * len(PROPERTIES)} segments x {args.total_hits} listings, "
+          f"{args.latency * 1000:.0f} ms latency, writing to {'local' if LOCAL else 'remote'} MongoDB")
+    backend.utils.embed("warm up")  # model download/load is not part of the measurement
+
+    cleanup(db)  # leftovers of an interrupted run would make "cold" look unchanged
+    results = []
+    try:
+        # New listings: every page is embedded and written
+        results.append(run_scenario("cold", args, 1_000_000))
+        # Same listings again: content hashes match, nothing is embedded or rewritten
+        results.append(run_scenario("unchanged", args, 1_000_000))
+        # Newest-first walk that stops at already stored pages
+        results.append(run_scenario("incremental", args, 1_000_000, incremental=True))
+        # New listings behind a flaky API, retries included
+        results.append(run_scenario("flaky", args, 2_000_000, error_rate=args.error_rate))
+    finally:
+        cleanup(db)
+
+    print(pd.DataFrame(results).to_string(index=False, float_format=lambda v: f"{v:.1f}"))
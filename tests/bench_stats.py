@@ -0,0 +1,109 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import math
+import time
+
+import numpy as np
+from pymongo import MongoClient, monitoring
+
+from backend.routers.stats import OPERATIONS, build_stats_pipeline
+
+BENCH_DB = "bench_stats_db"
+PROPERTY_TYPES = ['Apartamento', 'Casa', 'Lote', 'Local', 'Oficina', 'Finca', 'Parqueadero']
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Round trips to the server, the old endpoint paid one per call."""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name in ("aggregate", "getMore"):
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def seed(db, rows: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    for op in OPERATIONS:
+        db[op].drop()
+        area = rng.lognormal(4.3, 0.5, rows)
+        price = area * rng.lognormal(15 if op == "Venta" else 10.5, 0.4, rows)
+        docs = [
+            {"PROPERTY_TYPE": PROPERTY_TYPES[t], "STRATUM": int(s), "AREA": float(a), "PRICE": float(p)}
+            for t, s, a, p in zip(rng.integers(0, len(PROPERTY_TYPES), rows), rng.integers(1, 7, rows), area, price)
+        ]
+        db[op].insert_many(docs, ordered=False)
+
+
+def legacy_stats(db) -> dict:
+    # Previous endpoint: count_documents plus a $group per collection, four round trips
+    stats = {}
+    for op in OPERATIONS:
+        total = db[op].count_documents({})
+        agg = list(db[op].aggregate([{"$group": {"_id": None, "avg_price": {"$avg": "$PRICE"}, "avg_area": {"$avg": "$AREA"}}}]))
+        stats[op] = {"total_properties": total, **({k: agg[0][k] for k in ("avg_price", "avg_area")} if agg else {})}
+    return stats
+
+
+def facet_stats(db) -> dict:
+    return list(db[OPERATIONS[0]].aggregate(build_stats_pipeline()))[0]
+
+
+def check_agreement(db):
+    # Both paths must report the same totals and means before their timings are compared
+    legacy = legacy_stats(db)
+    overall = {doc["_id"]: doc for doc in facet_stats(db)["by_operation"]}
+    for op in OPERATIONS:
+        assert overall[op]["count"] == legacy[op]["total_properties"], op
+        for key in ("avg_price", "avg_area"):
+            assert math.isclose(overall[op][key], legacy[op][key], rel_tol=1e-9), (op, key)
+
+
+def time_calls(func, db, repeats: int) -> np.ndarray:
+    func(db)  # warm the cache, both paths then read from memory
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(db)
+        times.append(time.perf_counter() - start)
+    return np.array(times) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="/api/stats latency: four per-collection calls vs the single $facet aggregation")
+    parser.add_argument("--uri", default=os.getenv("MONGO_LOCAL_URI", "mongodb://localhost:27017"), help="MongoDB 7.0+ ($percentile)")
+    parser.add_argument("--rows", type=int, default=50_000, help="Listings per operation")
+    parser.add_argument("--repeats", type=int, default=30)
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded database")
+    args = parser.parse_args()
+
+    counter = CommandCounter()
+    client = MongoClient(args.uri, event_listeners=[counter])
+    db = client[BENCH_DB]
+    version = client.server_info()["version"]
+    if tuple(int(part) for part in version.split(".")[:2]) < (7, 0):
+        parser.error(f"MongoDB {version} has no $percentile, the $facet pipeline needs 7.0+")
+    print(f"🧪 {args.rows} listings per operation on {version}, {args.repeats} calls each")
+    seed(db, args.rows)
+
+    try:
+        check_agreement(db)
+        for name, func in [("legacy (4 calls)", legacy_stats), ("$facet (1 call)", facet_stats)]:
+            times = time_calls(func, db, args.repeats)
+            before = counter.count
+            func(db)
+            print(f"  {name:<18} p50 {np.median(times):8.1f} ms | p95 {np.percentile(times, 95):8.1f} ms | "
+                  f"{counter.count - before} round trips")
+    finally:
+        if not args.keep:
+            client.drop_database(BENCH_DB)
@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import optuna
+import pandas as pd
+
+from pipelines.utils import optimize as op
+from pipelines.utils import studies as st
+from tests.bench_optimize import synthetic_listings
+
+OBJECTIVES = {"xgboost": op.objective_xgboost, "lightgbm": op.objective_lightgbm}
+
+
+def daily_scrape(X: np.ndarray, y: np.ndarray, rows: int, day: int, growth: float) -> tuple[np.ndarray, np.ndarray, pd.DataFrame]:
+    """The same listings plus `growth` new ones per day, and the raw columns the fingerprint is taken over."""
+    n = int(rows * (1 + growth) ** day)
+    return X[:n], y[:n], pd.DataFrame({"AREA": np.exp(X[:n, 0]), "PRICE": np.exp(y[:n])})
+
+
+def timed_search(objective, X, y, key: str, fingerprint: dict, n_trials: int, uri: str) -> tuple[float, float, dict]:
+    start = time.perf_counter()
+    study, info = st.warm_started_search(objective, X, y, key, fingerprint, n_trials=n_trials, uri=uri)
+    return time.perf_counter() - start, study.best_value, info
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrain cost of warm-started studies against a full search on each day's data")
+    parser.add_argument("--model", choices=sorted(OBJECTIVES), default="xgboost")
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--trials", type=int, default=50)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--growth", type=float, default=0.01, help="New listings per day, as a fraction of the data")
+    args = parser.parse_args()
+
+    optuna.logging.set_verbosity(optuna.logging.ERROR)
+    objective = OBJECTIVES[args.model]
+    warm_uri, cold_uri = tempfile.mkdtemp(prefix="studies-warm-"), tempfile.mkdtemp(prefix="studies-cold-")
+    print(f"🧪 {args.model}: {args.trials}-trial searches, {args.rows} rows growing {args.growth:.0%} a day")
+
+    X_all, y_all = synthetic_listings(int(args.rows * (1 + args.growth) ** args.days))
+    for day in range(args.days):
+        X, y, raw = daily_scrape(X_all, y_all, args.rows, day, args.growth)
+        fingerprint = st.data_fingerprint(raw)
+        warm_time, warm_best, info = timed_search(objective, X, y, "bench", fingerprint, args.trials, warm_uri)
+        # A fresh storage every day is the previous behaviour: a full search from scratch
+        cold_time, cold_best, _ = timed_search(objective, X, y, f"bench-day-{day}", fingerprint, args.trials, cold_uri)
+        drift = f"{info['drift']:.4f}" if info["drift"] is not None else "   n/a"
+        print(f"  day {day}: drift {drift} | warm {info['n_trials']:3d} trials ({info['warm_start_trials']} enqueued) "
+              f"{warm_time:7.1f} s, MDAPE {warm_best:.5f} | full {cold_time:7.1f} s, MDAPE {cold_best:.5f}")
@@ -0,0 +1,160 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import random
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pipelines.utils.finca_raiz import INDEX_ANTIQUITY, OPERATION_INDEX, PROPERTY_INDEX
+from pipelines.utils.archive import ARCHIVE_URI, list_archive_files, read_archive_records
+
+
+# Marks synthetic listings, so benchmarks can clean up after themselves
+MOCK_LINK_PREFIX = "/mock/inmueble/"
+
+
+def load_recorded(batch_id: str, uri: str = ARCHIVE_URI) -> dict:
+    """Pages of an archived scrape (see pipelines/utils/archive.py), keyed by (operation_type_id, property_type_id, page)."""
+    recorded = {}
+    for path in list_archive_files(batch_id, uri):
+        for record in read_archive_records(path, uri):
+            key = (OPERATION_INDEX[record["operation"]], PROPERTY_INDEX[record["property"]], record["page"])
+            recorded[key] = json.dumps(record["response"]).encode()
+    return recorded
+
+
+def parse_segment_hits(spec: str) -> dict:
+    """'Arriendo:Apartamento=6400,Venta:Casa=300' -> {(2, 2): 6400, (1, 1): 300}"""
+    segment_hits = {}
+    for part in filter(None, spec.split(",")):
+        segment, hits = part.split("=")
+        operation, property = segment.split(":")
+        segment_hits[(OPERATION_INDEX[operation], PROPERTY_INDEX[property])] = int(hits)
+    return segment_hits
+
+
+@lru_cache(maxsize=4096)
+def synthetic_page(rows: int, page: int, property_type_id: int, operation_type_id: int, total: int, id_offset: int = 0) -> bytes:
+    first = (page - 1) * rows
+    base = (operation_type_id * 100 + property_type_id) * 10_000_000 + id_offset
+    hits = [
+        {"_source": {"listing": synthetic_listing(base + i, property_type_id, operation_type_id)}}
+        for i in range(first, min(first + rows, total))
+    ]
+    return json.dumps({"hits": {"total": {"value": total}, "hits": hits}}).encode()
+
+
+def synthetic_listing(listing_id: int, property_type_id: int, operation_type_id: int) -> dict:
+    rng = random.Random(listing_id)
+    return {
+        "id": listing_id,
+        "price": {"amount": rng.randint(800_000, 8_000_000) if operation_type_id == 2 else rng.randint(150_000_000, 2_000_000_000), "admin_included": rng.random() < 0.5},
+        "m2": rng.randint(25, 300),
+        "latitude": 4.55 + rng.random() * 0.25,
+        "longitude": -74.2 + rng.random() * 0.15,
+        "antiquity": rng.choice(list(INDEX_ANTIQUITY)),
+        "construction_year": rng.randint(1960, 2025),
+        "m2Built": rng.randint(25, 300),
+        "m2apto": rng.randint(25, 300),
+        "garage": rng.randint(0, 3),
+        "bathrooms": rng.randint(1, 4),
+        "rooms": rng.randint(1, 5),
+        "floor": rng.randint(1, 25),
+        "property_type_id": property_type_id,
+        "operation_type_id": operation_type_id,
+        "stratum": rng.randint(1, 6),
+        "bedrooms": rng.randint(1, 5),
+        "description": "Inmueble de prueba " * rng.randint(5, 60),
+        "link": f"{MOCK_LINK_PREFIX}{listing_id}",
+    }
+
+
+class MockFincaRaizHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True  # otherwise keep-alive responses stall on delayed ACKs
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: dict | bytes):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        config = self.server.config
+        time.sleep(config["latency"])
+
+        if self.path.endswith("/locations/infofinca-autocomplete"):
+            city = payload["variables"]["strSearch"]
+            return self._send(200, {"data": {"searchLocation": [{"type": "CITY", "name": city.title(), "id": f"{city}-id"}]}})
+
+        # Transient failures the client is expected to retry
+        if random.random() < config["error_rate"]:
+            return self._send(503, {"message": "Service Unavailable"})
+
+        params = payload["variables"]["params"]
+        rows, page = min(payload["variables"]["rows"], config["max_rows"]), params["page"]
+        property_type_id, operation_type_id = params["property_type_id"][0], params["operation_type_id"]
+
+        if config["recorded"]:
+            body = config["recorded"].get((operation_type_id, property_type_id, page))
+            return self._send(200, body or {"hits": {"total": {"value": 0}, "hits": []}})
+
+        total = config["segment_hits"].get((operation_type_id, property_type_id), config["total_hits"])
+        self._send(200, synthetic_page(rows, page, property_type_id, operation_type_id, total, config["id_offset"]))
+
+
+def start_mock_server(latency: float = 0.05, total_hits: int = 320, port: int = 0, segment_hits: dict | None = None,
+                      max_rows: int = 200, error_rate: float = 0.0, id_offset: int = 0, recorded: dict | None = None):
+    """
+    Start the stand-in API in a background thread. Returns (server, api_url).
+
+    Every (operation, property type) segment has `total_hits` synthetic listings unless overridden
+    in `segment_hits`, pages are capped at `max_rows` rows like the real API, and `error_rate` of
+    the search requests fail with a 503. `id_offset` shifts the synthetic listing ids, so repeated
+    runs can look like new listings. With `recorded` (see `load_recorded`) archived pages are
+    served as they were scraped instead.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockFincaRaizHandler)
+    server.daemon_threads = True
+    server.config = {
+        "latency": latency, "total_hits": total_hits, "segment_hits": segment_hits or {}, "max_rows": max_rows,
+        "error_rate": error_rate, "id_offset": id_offset, "recorded": recorded or {},
+    }
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/api/v1"
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Local stand-in for the Finca Raíz search API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--total-hits", type=int, default=320, help="Listings per (operation, property type) segment")
+    parser.add_argument("--segment-hits", default="", help="Per segment overrides, e.g. Arriendo:Apartamento=6400,Venta:Casa=300")
+    parser.add_argument("--max-rows", type=int, default=200, help="Largest page size served")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of search requests failing with 503")
+    parser.add_argument("--id-offset", type=int, default=0, help="Shift synthetic listing ids (fresh listings per run)")
+    parser.add_argument("--recorded", default=None, help="Serve the pages of this archived batch instead of synthetic ones")
+    parser.add_argument("--recorded-uri", default=ARCHIVE_URI)
+    args = parser.parse_args()
+
+    server, url = start_mock_server(
+        latency=args.latency, total_hits=args.total_hits, port=args.port, segment_hits=parse_segment_hits(args.segment_hits),
+        max_rows=args.max_rows, error_rate=args.error_rate, id_offset=args.id_offset,
+        recorded=load_recorded(args.recorded, args.recorded_uri) if args.recorded else None,
+    )
+    print(f"🧪 Mock Finca Raíz API listening on {url} (Ctrl+C to stop)", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -5,8 +5,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from pipelines.cleaning import (
     remove_duplicates_by_source_op,
     remove_erroneous_values_op,
-    cap_prices_by_property_type_op,
-    cap_numeric_fields_op
+    cap_outliers_op
 )
 
 if __name__ == "__main__":
@@ -16,19 +15,19 @@ if __name__ == "__main__":
     collections = ["Arriendo", "Venta"]
     
     print("\n1. Removing duplicates...")
-    dedup_stats = remove_duplicates_by_source_op.python_func(local=USE_LOCAL_DB)
+    dedup_stats = remove_duplicates_by_source_op.python_func(collections=collections, local=USE_LOCAL_DB)
     print(f"Stats: {dedup_stats}")
     
-    print("\n2. Removing erroneous values...")
+    print("\n2a. Dry run of the cleaning rules...")
+    dry_stats = remove_erroneous_values_op.python_func(collections=collections, local=USE_LOCAL_DB, dry_run=True)
+    print(f"Stats: {dry_stats}")
+
+    print("\n2b. Removing erroneous values...")
     err_stats = remove_erroneous_values_op.python_func(collections=collections, local=USE_LOCAL_DB)
     print(f"Stats: {err_stats}")
     
-    print("\n3. Capping prices by property type...")
-    price_stats = cap_prices_by_property_type_op.python_func(collections=collections, local=USE_LOCAL_DB)
-    print(f"Stats: {price_stats}")
-    
-    print("\n4. Capping numeric fields...")
-    num_stats = cap_numeric_fields_op.python_func(collections=collections, local=USE_LOCAL_DB)
-    print(f"Stats: {num_stats}")
+    print("\n3. Capping prices and numeric fields by property type...")
+    cap_stats = cap_outliers_op.python_func(collections=collections, local=USE_LOCAL_DB)
+    print(f"Stats: {cap_stats}")
     
     print("\n✅ All Cleaning components completed locally!")
@@ -0,0 +1,57 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from backend.geo import HEATMAP_PRECISIONS, geohash_encode, tile_bbox, zoom_to_precision
+
+# Reference geohashes from the original geohash.org examples
+KNOWN_HASHES = [
+    (57.64911, 10.40744, "u4pruydqqvj"),
+    (42.605, -5.603, "ezs42"),
+    (-25.382708, -49.265506, "6gkzwgjz"),
+]
+
+
+def test_known_hashes():
+    for lat, lon, expected in KNOWN_HASHES:
+        hashes, _, _ = geohash_encode([lat], [lon], len(expected))
+        assert hashes[0] == expected, (lat, lon, hashes[0], expected)
+
+
+def test_vectorized_matches_prefixes_and_centers():
+    rng = np.random.default_rng(0)
+    lat, lon = rng.uniform(4.4, 4.9, 1000), rng.uniform(-74.3, -73.9, 1000)
+    longest, _, _ = geohash_encode(lat, lon, 9)
+    for precision in HEATMAP_PRECISIONS:
+        hashes, center_lat, center_lon = geohash_encode(lat, lon, precision)
+        # A coarser geohash is a prefix of the finer one, and every point lies in its cell
+        assert all(fine.startswith(coarse) for fine, coarse in zip(longest, hashes))
+        lat_bits, lon_bits = 5 * precision // 2, 5 * precision - 5 * precision // 2
+        assert (np.abs(lat - center_lat) <= 90 / (1 << lat_bits)).all()
+        assert (np.abs(lon - center_lon) <= 180 / (1 << lon_bits)).all()
+
+
+def test_edges_are_clipped():
+    hashes, _, _ = geohash_encode([90.0, -90.0], [180.0, -180.0], 5)
+    assert list(hashes) == ["zzzzz", "00000"]
+
+
+def test_zoom_and_tiles():
+    precisions = [zoom_to_precision(z) for z in range(23)]
+    assert precisions == sorted(precisions) and set(precisions) == set(HEATMAP_PRECISIONS)
+    min_lat, min_lon, max_lat, max_lon = tile_bbox(0, 0, 0)
+    assert (min_lon, max_lon) == (-180.0, 180.0) and abs(max_lat - 85.0511) < 1e-3 and abs(min_lat + 85.0511) < 1e-3
+    # Bogotá at zoom 12 (tile 1205, 1995) contains the city center
+    min_lat, min_lon, max_lat, max_lon = tile_bbox(12, 1205, 1995)
+    assert min_lat < 4.65 < max_lat and min_lon < -74.08 < max_lon
+
+
+if __name__ == "__main__":
+    print("🧪 Testing geohash and tile helpers...")
+    test_known_hashes()
+    test_vectorized_matches_prefixes_and_centers()
+    test_edges_are_clipped()
+    test_zoom_and_tiles()
+    print("✅ Geo checks passed!")
@@ -0,0 +1,71 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from pipelines.utils.local_cleaning import duplicate_mask
+
+
+def random_snapshot(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Listings crawled several times, some without a source, code or scrape time."""
+    rng = np.random.default_rng(seed)
+    start = datetime(2026, 1, 1)
+    df = pd.DataFrame({
+        "_id": rng.permutation(rows).astype(str),
+        "SOURCE": rng.choice(["finca_raiz", "metrocuadrado"], rows).astype(object),
+        "WEB_PROPERTY_CODE": pd.array(rng.integers(0, rows // 4, rows), dtype="Int64"),
+        "scraped_at": [start + timedelta(hours=int(h)) for h in rng.integers(0, 48, rows)],
+    })
+    df.loc[rng.random(rows) < 0.05, "SOURCE"] = None
+    df.loc[rng.random(rows) < 0.05, "WEB_PROPERTY_CODE"] = pd.NA
+    df.loc[rng.random(rows) < 0.1, "scraped_at"] = pd.NaT
+    return df
+
+
+def expected_duplicates(df: pd.DataFrame) -> np.ndarray:
+    # Newest scrape first (missing last), then the highest _id, the first row of each group wins
+    keyed = df.dropna(subset=["SOURCE", "WEB_PROPERTY_CODE"])
+    ordered = keyed.sort_values(["scraped_at", "_id"], ascending=False, na_position="last")
+    losers = ordered.index[ordered.duplicated(["SOURCE", "WEB_PROPERTY_CODE"], keep="first")]
+    return df.index.isin(losers)
+
+
+def mask_of(df: pd.DataFrame) -> np.ndarray:
+    return duplicate_mask(pa.Table.from_pandas(df, preserve_index=False)).to_numpy(zero_copy_only=False)
+
+
+def test_matches_pandas_reference():
+    for seed in range(3):
+        df = random_snapshot(4000, seed)
+        expected = expected_duplicates(df)
+        assert expected.any() and not expected.all()
+        assert (mask_of(df) == expected).all(), seed
+
+
+def test_keeps_latest_scrape():
+    df = pd.DataFrame({
+        "_id": ["a", "b", "c", "d", "e"],
+        "SOURCE": ["finca_raiz"] * 4 + [None],
+        "WEB_PROPERTY_CODE": [1, 1, 1, 2, 1],
+        "scraped_at": [datetime(2026, 1, 1), datetime(2026, 1, 3), pd.NaT, datetime(2026, 1, 2), datetime(2026, 1, 9)],
+    })
+    # Only "b" survives in its group, "d" is alone and "e" has no source
+    assert mask_of(df).tolist() == [True, False, True, False, False]
+
+
+def test_no_duplicates():
+    df = random_snapshot(100).drop_duplicates(["SOURCE", "WEB_PROPERTY_CODE"])
+    assert not mask_of(df).any()
+
+
+if __name__ == "__main__":
+    print("🧪 Testing the local duplicate mask...")
+    test_matches_pandas_reference()
+    test_keeps_latest_scrape()
+    test_no_duplicates()
+    print("✅ Local cleaning checks passed!")
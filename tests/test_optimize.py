@@ -0,0 +1,41 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pipelines.utils.optimize import THREADS_PER_TRIAL, plan_parallelism
+
+
+def test_never_oversubscribes():
+    for cores in range(1, 129):
+        for concurrent_trials in [None, 0, -1, 1, 2, 3, 7, 16, 200]:
+            trials, threads = plan_parallelism(cores, concurrent_trials)
+            assert trials >= 1 and threads >= 1
+            assert trials * threads <= cores, (cores, concurrent_trials, trials, threads)
+
+
+def test_default_split():
+    assert plan_parallelism(16) == (4, 4)
+    assert plan_parallelism(6) == (1, 6)
+    assert plan_parallelism(2) == (1, 2)
+    assert plan_parallelism(32, 0) == (32 // THREADS_PER_TRIAL, THREADS_PER_TRIAL)
+
+
+def test_explicit_trials():
+    assert plan_parallelism(16, 3) == (3, 5)
+    assert plan_parallelism(8, 8) == (8, 1)
+    # More trials than cores are capped, one thread each
+    assert plan_parallelism(4, 10) == (4, 1)
+
+
+def test_detects_cores():
+    trials, threads = plan_parallelism()
+    assert trials * threads <= (os.process_cpu_count() or 1)
+
+
+if __name__ == "__main__":
+    print("🧪 Testing the HPO core budget...")
+    test_never_oversubscribes()
+    test_default_split()
+    test_explicit_trials()
+    test_detects_cores()
+    print("✅ Parallelism checks passed!")
@@ -0,0 +1,89 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import mongomock
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from pipelines.utils import rules as rl
+from pipelines.utils.local_cleaning import erroneous_mask
+
+# Every operator, on top of the rules config.json ships with
+EXTRA_RULES = [
+    {"name": "floor_not_ground", "field": "FLOOR", "op": "ne", "value": 1, "property_types": ["Casa"]},
+    {"name": "rooms_sentinel", "field": "ROOMS", "op": "in", "value": [0, 99]},
+    {"name": "stratum_low", "field": "STRATUM", "op": "lt", "value": 1},
+    {"name": "stratum_high", "field": "STRATUM", "op": "gte", "value": 7},
+]
+
+
+def random_listings(rows: int, seed: int = 0) -> list[dict]:
+    """Listings around the rules' thresholds, with missing fields and nulls mixed in."""
+    rng = np.random.default_rng(seed)
+    choices = {
+        "PROPERTY_TYPE": ["Apartamento", "Apartaestudio", "Casa", "Lote", None],
+        "FLOOR": [1, 2, 202, None],
+        "STRATUM": [0, 3, 7, 101, None],
+        "ROOMS": [0, 2, 99, None],
+        "AREA": [-5.0, 0.0, 60.0, 400.0, 401.0, None],
+        "PRICE": [50_000.0, 100_000.0, 2_000_000.0, 20_000_000.0, 30_000_000.0, None],
+    }
+    docs = []
+    for i in range(rows):
+        doc = {"_id": i}
+        for field, values in choices.items():
+            if rng.random() < 0.1:
+                continue  # missing field
+            doc[field] = values[rng.integers(len(values))]
+        docs.append(doc)
+    return docs
+
+
+def frame(docs: list[dict]) -> pd.DataFrame:
+    df = pd.DataFrame(docs).set_index("_id").sort_index()
+    for field in ["FLOOR", "STRATUM", "ROOMS", "AREA", "PRICE"]:
+        df[field] = pd.to_numeric(df[field])
+    return df
+
+
+def mongo_matches(docs: list[dict], query: dict) -> np.ndarray:
+    collection = mongomock.MongoClient().db.listings
+    collection.insert_many(docs)
+    matched = {doc["_id"] for doc in collection.find(query, {"_id": 1})}
+    return np.array([doc["_id"] in matched for doc in sorted(docs, key=lambda doc: doc["_id"])])
+
+
+def test_rules_agree_across_backends():
+    docs = random_listings(2000)
+    df = frame(docs)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for rule in rl.load_rules() + EXTRA_RULES:
+        expected = mongo_matches(docs, rl.rule_filter(rule))
+        assert (rl.compile_mask(df, [rule]) == expected).all(), f"pandas disagrees with MongoDB on {rule['name']}"
+        assert (erroneous_mask(table, [rule]).to_numpy(zero_copy_only=False) == expected).all(), f"Arrow disagrees with MongoDB on {rule['name']}"
+
+
+def test_combined_rules():
+    docs = random_listings(2000, seed=1)
+    df = frame(docs)
+    rules = rl.load_rules() + EXTRA_RULES
+    expected = mongo_matches(docs, rl.compile_filter(rules))
+    assert expected.any() and not expected.all()
+    assert (rl.compile_mask(df, rules) == expected).all()
+    assert (erroneous_mask(pa.Table.from_pandas(df, preserve_index=False), rules).to_numpy(zero_copy_only=False) == expected).all()
+
+
+def test_no_rules_match_nothing():
+    docs = random_listings(50)
+    assert not mongo_matches(docs, rl.compile_filter([])).any()
+    assert not rl.compile_mask(frame(docs), []).any()
+
+
+if __name__ == "__main__":
+    print("🧪 Testing the cleaning rule compilers...")
+    test_rules_agree_across_backends()
+    test_combined_rules()
+    test_no_rules_match_nothing()
+    print("✅ Rule checks passed!")
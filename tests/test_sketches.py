@@ -0,0 +1,110 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import mongomock
+import numpy as np
+
+from datetime import datetime, timedelta
+
+from pipelines.utils import capping
+from pipelines.utils.capping import CleaningState, cap_collection
+from pipelines.utils.sketches import DDSketch, bucket_expression
+
+QUANTILES = [0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 1.0]
+
+
+def sketch_of(values, relative_accuracy: float = 0.01) -> DDSketch:
+    sketch = DDSketch(relative_accuracy)
+    for value in values:
+        sketch.add(float(value))
+    return sketch
+
+
+def test_quantiles_within_relative_accuracy():
+    rng = np.random.default_rng(0)
+    for accuracy in [0.01, 0.05]:
+        # Heavy-tailed like listing prices, spanning several orders of magnitude
+        values = rng.lognormal(15, 1.5, 20_000)
+        sketch = sketch_of(values, accuracy)
+        for q in QUANTILES:
+            exact = np.quantile(values, q, method="lower")
+            assert abs(sketch.quantile(q) - exact) <= accuracy * exact * (1 + 1e-9), (accuracy, q)
+
+
+def test_non_positive_values_and_empty():
+    assert DDSketch().quantile(0.5) is None
+    sketch = sketch_of([-3.0, 0.0, 0.0, 10.0])
+    assert sketch.zero_count == 3 and sketch.count == 4
+    assert sketch.quantile(0.5) == 0.0
+    assert abs(sketch.quantile(1.0) - 10.0) <= 0.01 * 10.0
+
+
+def test_merge_equals_one_sketch():
+    rng = np.random.default_rng(1)
+    first, second = rng.lognormal(10, 1, 5000), np.concatenate([rng.lognormal(12, 1, 5000), [0.0] * 10])
+    merged = sketch_of(first)
+    merged.merge(sketch_of(second))
+    whole = sketch_of(np.concatenate([first, second]))
+    assert merged.bins == whole.bins and merged.zero_count == whole.zero_count
+    assert [merged.quantile(q) for q in QUANTILES] == [whole.quantile(q) for q in QUANTILES]
+
+    try:
+        merged.merge(DDSketch(0.05))
+        raise AssertionError("merging different accuracies must fail")
+    except ValueError:
+        pass
+
+
+def test_dict_round_trip():
+    sketch = sketch_of(np.random.default_rng(2).lognormal(5, 2, 1000).tolist() + [0.0])
+    restored = DDSketch.from_dict(sketch.to_dict())
+    assert restored.bins == sketch.bins and restored.zero_count == sketch.zero_count
+    assert all(isinstance(key, str) for key in sketch.to_dict()["bins"])
+
+
+def test_server_side_buckets_match():
+    values = [0.0, -1.0, 1e-3, 0.5, 1.0, 2.0, 1234.5, 2.5e6, 9.99e9]
+    collection = mongomock.MongoClient().db.values
+    collection.insert_many([{"_id": i, "PRICE": value} for i, value in enumerate(values)])
+    docs = collection.aggregate([{"$project": {"key": bucket_expression("$PRICE")}}, {"$sort": {"_id": 1}}])
+    assert [doc["key"] for doc in docs] == [DDSketch().key(value) for value in values]
+
+
+def sketch_matching(collection, fields, match, relative_accuracy=0.01):
+    # collect_sketches without the aggregation, mongomock doesn't evaluate expressions inside arrays
+    sketches = {}
+    for doc in collection.find(match):
+        for field in fields:
+            sketches.setdefault(doc["PROPERTY_TYPE"], {}).setdefault(field, DDSketch(relative_accuracy)).add(doc[field])
+    return sketches
+
+
+def test_rescraped_listings_sketched_once():
+    original, capping.collect_sketches = capping.collect_sketches, sketch_matching
+    try:
+        db = mongomock.MongoClient().db
+        state, start = CleaningState(db), datetime(2026, 1, 1)
+        listings = [{"_id": i, "PROPERTY_TYPE": "Apartamento", "PRICE": 1e6 * (i + 1)} for i in range(100)]
+        db.Venta.insert_many([{**doc, "scraped_at": start, "first_seen_at": start} for doc in listings])
+        cap_collection(db.Venta, state, ["PRICE"])
+
+        # The next scrape rewrites half of them and inserts ten new ones
+        later = start + timedelta(days=1)
+        db.Venta.update_many({"_id": {"$lt": 50}}, {"$set": {"scraped_at": later}})
+        db.Venta.insert_many([{"_id": 100 + i, "PROPERTY_TYPE": "Apartamento", "PRICE": 5e5, "scraped_at": later, "first_seen_at": later}
+                              for i in range(10)])
+        cap_collection(db.Venta, state, ["PRICE"])
+        assert DDSketch.from_dict(state.load("Venta")["sketches"]["Apartamento"]["PRICE"]).count == 110
+    finally:
+        capping.collect_sketches = original
+
+if __name__ == "__main__":
+    print("🧪 Testing the quantile sketches...")
+    test_quantiles_within_relative_accuracy()
+    test_non_positive_values_and_empty()
+    test_merge_equals_one_sketch()
+    test_dict_round_trip()
+    test_server_side_buckets_match()
+    test_rescraped_listings_sketched_once()
+    print("✅ Sketch checks passed!")
@@ -0,0 +1,75 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pandas as pd
+
+from pipelines.utils.studies import (DRIFT_THRESHOLD, SMALL_DRIFT_TRIALS, data_drift, data_fingerprint,
+                                     study_key, trial_budget)
+
+
+def listings(rows: int, seed: int = 0, price_shift: float = 0.0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "AREA": rng.lognormal(4.3, 0.5, rows),
+        "PRICE": rng.lognormal(19, 0.6, rows) * (1 + price_shift),
+        "STRATUM": rng.integers(1, 7, rows).astype(float),
+    })
+
+
+def test_identical_data_has_no_drift():
+    fingerprint = data_fingerprint(listings(50_000))
+    assert data_drift(fingerprint, fingerprint) == 0.0
+    # Another sample of the same distribution, at a snapshot's size, stays under the warm-start threshold
+    assert data_drift(fingerprint, data_fingerprint(listings(50_000, seed=1))) <= DRIFT_THRESHOLD
+
+
+def test_row_count_change():
+    before = data_fingerprint(listings(1000))
+    after = {**before, "rows": 1300}
+    assert abs(data_drift(before, after) - 0.3) < 1e-12
+    assert abs(data_drift(before, {**before, "rows": 700}) - 0.3) < 1e-12
+
+
+def test_quantile_shift_in_iqr_units():
+    before = {"rows": 100, "quantiles": {"PRICE": [0.0, 10.0, 15.0, 20.0, 40.0]}}
+    after = {"rows": 100, "quantiles": {"PRICE": [0.0, 10.0, 15.0, 25.0, 40.0]}}
+    assert data_drift(before, after) == 0.5
+    # A constant column falls back to its median, then to absolute units
+    flat = {"rows": 100, "quantiles": {"PRICE": [4.0] * 5}}
+    assert data_drift(flat, {"rows": 100, "quantiles": {"PRICE": [5.0] * 5}}) == 0.25
+    zero = {"rows": 100, "quantiles": {"PRICE": [0.0] * 5}}
+    assert data_drift(zero, {"rows": 100, "quantiles": {"PRICE": [0.5] * 5}}) == 0.5
+    # A 30% price rise is far beyond the threshold
+    assert data_drift(data_fingerprint(listings(5000)), data_fingerprint(listings(5000, price_shift=0.3))) > DRIFT_THRESHOLD
+
+
+def test_different_columns_are_infinite():
+    df = listings(100)
+    assert data_drift(data_fingerprint(df), data_fingerprint(df.drop(columns="STRATUM"))) == float("inf")
+
+
+def test_trial_budget():
+    assert trial_budget(100, None) == 100
+    assert trial_budget(100, float("inf")) == 100
+    assert trial_budget(100, DRIFT_THRESHOLD * 2) == 100
+    assert trial_budget(100, DRIFT_THRESHOLD) == SMALL_DRIFT_TRIALS
+    assert trial_budget(3, 0.0) == 3
+
+
+def test_study_key_follows_features():
+    assert study_key("lightgbm", ["AREA", "STRATUM"]) == study_key("lightgbm", ["AREA", "STRATUM"])
+    assert study_key("lightgbm", ["AREA", "STRATUM"]) != study_key("lightgbm", ["AREA"])
+    assert study_key("lightgbm", ["AREA"]) != study_key("random_forest", ["AREA"])
+
+
+if __name__ == "__main__":
+    print("🧪 Testing the HPO study helpers...")
+    test_identical_data_has_no_drift()
+    test_row_count_change()
+    test_quantile_shift_in_iqr_units()
+    test_different_columns_are_infinite()
+    test_trial_budget()
+    test_study_key_follows_features()
+    print("✅ Study checks passed!")
@@ -0,0 +1,51 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import datetime
+
+import pyarrow as pa
+
+from pipelines.utils.finca_raiz import LISTING_SCHEMA
+from pipelines.utils.writer import content_hashes
+
+
+def listing(code: int, **values) -> dict:
+    return {"WEB_PROPERTY_CODE": code, "PROPERTY_TYPE": "Apartamento", "PRICE": 2_500_000.0, "AREA": 60.0,
+            "GARAGE": 1, "ROOMS": 3, "STRATUM": 4, **values}
+
+
+def batch(*rows: dict) -> pa.Table:
+    return pa.Table.from_pylist(list(rows), schema=LISTING_SCHEMA)
+
+
+def test_hash_ignores_neighbours():
+    # A null in another row used to turn GARAGE into float64 for the whole batch
+    row = listing(1)
+    alone = content_hashes(batch(row))[0]
+    assert content_hashes(batch(row, listing(2, GARAGE=None)))[0] == alone
+    assert content_hashes(batch(listing(3, ROOMS=None, PRICE=None), row))[1] == alone
+    assert content_hashes(batch(*[listing(i) for i in range(50)], row))[-1] == alone
+
+
+def test_hash_follows_content():
+    base = content_hashes(batch(listing(1)))[0]
+    assert content_hashes(batch(listing(1, PRICE=2_600_000.0)))[0] != base
+    assert content_hashes(batch(listing(1, GARAGE=None)))[0] != base
+    assert content_hashes(batch(listing(2)))[0] != base
+
+
+def test_hash_ignores_bookkeeping():
+    table = batch(listing(1))
+    stamped = (table.append_column("scraped_at", pa.array([datetime.now()], pa.timestamp("us")))
+                    .append_column("batch_id", pa.array(["2026-10-19_00-00-00"]))
+                    .append_column("_id", pa.array(["abc"])))
+    assert content_hashes(stamped) == content_hashes(table)
+
+
+if __name__ == "__main__":
+    print("🧪 Testing the listing writer...")
+    test_hash_ignores_neighbours()
+    test_hash_follows_content()
+    test_hash_ignores_bookkeeping()
+    print("✅ Writer checks passed!")